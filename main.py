@@ -1,12 +1,52 @@
-import pandas as pd
+import time
+_import_started = time.perf_counter()
+
+import argparse
+import enum
+import importlib
+import multiprocessing
+import queue
+import signal
 import os
 import json
-import time
-import requests
+import re
+import sqlite3
+import string
+import hashlib
 import logging
-from telegram import Bot
-from telegram.ext import Application
 import asyncio
+import concurrent.futures
+import collections
+import datetime
+import heapq
+import random
+import urllib.parse
+
+
+class _LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access.
+    The real module then replaces the stand-in in this module's globals, so
+    later lookups cost nothing.
+    """
+
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attribute)
+
+
+# pandas, numpy, httpx and python-telegram-bot account for most of the start
+# up time; they are imported when a sweep or a message first needs them
+pd = _LazyModule('pandas', 'pd')
+np = _LazyModule('numpy', 'np')
+httpx = _LazyModule('httpx', 'httpx')
+
+_import_seconds = time.perf_counter() - _import_started
 
 # Telegram bot token and chat ID
 bot_token = 'YOUR_BOT_TOKEN_HERE'
@@ -26,25 +66,1639 @@ config_dict = {
     }
 }
 
+# Course portal endpoint and HTTP client settings
+portal_url = "http://appserver.fet.edu.jo:7778/courses/actions/rmiMethod"
+portal_headers = {
+    'Accept': '*/*',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Content-Type': 'application/x-www-form-urlencoded',
+    'Origin': 'http://appserver.fet.edu.jo:7778',
+    'Referer': 'http://appserver.fet.edu.jo:7778/courses/index.jsp',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36',
+}
+# The session cookie is issued by the portal's index page (index.jsp next to
+# /actions/). It is fetched before the first getCourses call and again
+# whenever the portal answers as if the session expired.
+portal_session_path = '../index.jsp'
+
+# Failed page requests (connection errors, timeouts, retry_statuses and
+# unparseable payloads) are retried up to max_attempts times with full
+# jitter: a random wait up to backoff_base * 2 ** (attempt - 1), capped at
+# backoff_max seconds
+retry_settings = {
+    'max_attempts': 4,
+    'backoff_base': 0.5,
+    'backoff_max': 10.0,
+    'retry_statuses': (429, 500, 502, 503, 504),
+}
+
+# After failure_threshold consecutive failed portal requests, requests fail
+# fast for reset_timeout seconds; then one trial request decides whether the
+# circuit closes again
+circuit_breaker_settings = {
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+}
+http_settings = {
+    'max_connections': 10,            # Connection pool size shared by all page fetches
+    'max_keepalive_connections': 10,  # Idle connections kept open between iterations
+    'max_concurrent_requests': 5,     # In-flight portal requests at any time
+    'connect_timeout': 5,             # Seconds to establish a connection
+    'request_timeout': 15,            # Seconds for each read/write/pool wait
+}
+
+# Sweep scheduling: how many combinations run at once and how far ahead
+# pages are fetched speculatively
+fetch_settings = {
+    'max_concurrent_combinations': 4,
+    'prefetch_pages': 3,
+    'max_pages': 99,
+    # Only the pages whose fingerprints changed are diffed, unless they hold
+    # more than this fraction of the catalog's rows
+    'incremental_diff_max_fraction': 0.5,
+}
+
+# Token buckets for each remote API. 'rate' is the starting requests per
+# second; it grows by 'increase_step' after healthy responses and is cut by
+# 'decrease_factor' on 429/5xx responses or latency above 'target_latency'.
+rate_limit_settings = {
+    'portal': {
+        'rate': 2.0,
+        'burst': 5,
+        'min_rate': 0.2,
+        'max_rate': 20.0,
+        'increase_step': 0.1,
+        'decrease_factor': 0.5,
+        'target_latency': 2.0,
+    },
+    'telegram': {
+        'rate': 25.0,
+        'burst': 30,
+        'min_rate': 1.0,
+        'max_rate': 30.0,
+        'increase_step': 0.5,
+        'decrease_factor': 0.5,
+        'target_latency': 5.0,
+    },
+}
+
+# Limiter settings for each individual chat (Telegram allows roughly one
+# message per second per chat)
+chat_rate_limit_settings = {
+    'rate': 1.0,
+    'burst': 3,
+    'min_rate': 0.05,
+    'max_rate': 1.0,
+    'increase_step': 0.05,
+    'decrease_factor': 0.5,
+    'target_latency': 5.0,
+}
+
+# Notification dispatch: Telegram rejects messages longer than 4096 characters
+dispatch_settings = {
+    'max_message_length': 4096,
+    'message_separator': '\n\n' + '-' * 20 + '\n\n',
+    'max_send_attempts': 3,
+}
+
+# Notification rendering: 'format' picks a set of message_templates and
+# 'language' a set of message_labels
+render_settings = {
+    'format': 'plain',
+    'language': 'en',
+}
+
+# Message templates use {field} placeholders only. Row fields are the course
+# columns (name, sectionNo, status, ...), 'old'/'new' for modified values,
+# 'fields' (one 'field' line per column) and 'location'; constant fields are
+# 'title', '<column>_label', 'previous_label' and 'new_label'. A format with
+# a 'heading' renders each row as one line and sends a compact digest per
+# change type and column instead of one message per row.
+message_templates = {
+    'plain': {
+        'added': '{title}\n\n{fields}\n\n{location}',
+        'removed': '{title}\n\n{fields}\n\n{location}',
+        'modified': ('{title}\n\n{name_label}: {name}\n{sectionNo_label}: {sectionNo}\n'
+                     '{previous_label}: {old}\n{new_label}: {new}\n\n{location}'),
+        'field': '{label} : {value}',
+    },
+    # Telegram's legacy Markdown; values are escaped, template text is not
+    'markdown': {
+        'parse_mode': 'Markdown',
+        'added': '*{title}*\n\n{fields}\n\n{location}',
+        'removed': '*{title}*\n\n{fields}\n\n{location}',
+        'modified': ('*{title}*\n\n*{name_label}:* {name}\n*{sectionNo_label}:* {sectionNo}\n'
+                     '*{previous_label}:* {old}\n*{new_label}:* {new}\n\n{location}'),
+        'field': '*{label}:* {value}',
+    },
+    'digest': {
+        'heading': '{title} ({count})\n{location}\n',
+        'added': '+ {name} / {sectionNo}: {status}, {days} {times}, {lecturers}',
+        'removed': '- {name} / {sectionNo}',
+        'modified': '{name} / {sectionNo}: {old} -> {new}',
+    },
+}
+
+# Localized labels; 'modified', 'previous' and 'new' take the column label
+message_labels = {
+    'en': {
+        'added': 'Changes Occurs: NEW COURSE(S) ADDED',
+        'removed': 'Changes Occurs: COURSE(S) DELETED',
+        'modified': 'Changes Detected in {column}',
+        'previous': 'Previous {column}',
+        'new': 'New {column}',
+        'columns': {
+            'name': 'Course Name', 'sectionNo': 'Section', 'status': 'Status',
+            'times': 'Times', 'days': 'Days', 'rooms': 'Rooms',
+            'lecturers': 'Lecturers', 'hours': 'Hours', 'remarks': 'Remarks',
+        },
+        'status': {
+            'unknown': 'Unknown', 'available': 'Available',
+            'cancelled': 'Cancelled', 'closed': 'Closed',
+        },
+    },
+    'ar': {
+        'added': 'تغييرات: تمت إضافة مواد جديدة',
+        'removed': 'تغييرات: تم حذف مواد',
+        'modified': 'تغييرات في {column}',
+        'previous': '{column} (السابق)',
+        'new': '{column} (الجديد)',
+        'columns': {
+            'name': 'اسم المادة', 'sectionNo': 'الشعبة', 'status': 'الحالة',
+            'times': 'الوقت', 'days': 'الأيام', 'rooms': 'القاعة',
+            'lecturers': 'المدرس', 'hours': 'الساعات', 'remarks': 'ملاحظات',
+        },
+        'status': {
+            'unknown': 'غير معروفة', 'available': 'متاحة',
+            'cancelled': 'ملغاة', 'closed': 'مغلقة',
+        },
+    },
+}
+
+# Course sections are matched between snapshots on these columns, and
+# modified values are reported in this column order
+course_key_columns = ['name', 'sectionNo']
+priority_columns = ['status', 'times', 'days', 'rooms', 'lecturers', 'hours', 'remarks']
+
+# Snapshot persistence: the current row of every section and a log of every
+# change live in a SQLite database. Only changed rows are written, batched
+# once per debounce window. CSVs from older versions are imported from
+# csv_dir the first time a combination is seen.
+persist_settings = {
+    'database_path': './course_history.sqlite3',
+    'csv_dir': './Data_CSVs',
+    'write_debounce_seconds': 5,
+}
+
+# Per-chat subscriptions live in the course store; changes made from another
+# process (scripts/subscriptions.py) are picked up within reload_seconds.
+# Chats listed in list_of_chat_ids that have no subscriptions keep receiving
+# every change enabled in notification_settings.
+subscription_settings = {
+    'reload_seconds': 60,
+}
+
+# Cold start budget checked by --measure-startup: seconds from the start of
+# the module import until the bot object is ready
+startup_settings = {
+    'target_seconds': 0.5,
+}
+
+# Multi-process mode: combinations are sharded across this many polling
+# processes that report changesets to the main (notifier) process
+worker_settings = {
+    'processes': 0,
+    'restart_delay': 5,
+    'shutdown_timeout': 10,
+}
+
+# Adaptive polling: every combination has its own interval. It drops to
+# min_interval after a change, grows by backoff_factor after
+# quiet_polls_before_backoff unchanged polls and by failure_backoff_factor
+# after a failed poll, never beyond max_interval. Each due time is spread by
+# +/- jitter (a fraction of the interval). Inside a registration window
+# ('start'/'end' as 'YYYY-MM-DD HH:MM', optionally only between the 'daily'
+# 'HH:MM-HH:MM' hours) no combination waits longer than the window's
+# 'interval' seconds.
+schedule_settings = {
+    'base_interval': run_script_after_every_seconds,
+    'min_interval': 5,
+    'max_interval': 900,
+    'backoff_factor': 1.5,
+    'quiet_polls_before_backoff': 3,
+    'failure_backoff_factor': 2.0,
+    'jitter': 0.1,
+    'registration_windows': [
+        # {'start': '2026-02-01 08:00', 'end': '2026-02-10 23:59',
+        #  'daily': '08:00-16:00', 'interval': 3},
+    ],
+}
+
+# Instrumentation: Prometheus text metrics are served on
+# http://host:port/metrics (port 0 disables the endpoint) and log records
+# are also written as JSON lines to json_log_path (None disables it)
+metrics_settings = {
+    'host': '127.0.0.1',
+    'port': 9108,
+    'json_log_path': './bot.jsonl',
+    'latency_buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+}
+
 # Configure logging
 logging.basicConfig(filename='bot.log',
                     level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+# A flat record of the getCourses payload, and one 'key':value pair inside
+# it. Values are single-quoted strings or bare literals (numbers,
+# true/false/null); braces inside quoted values do not end a record. Double
+# quotes are never captured, which drops them just like the old
+# replace('"', '') did.
+_PAYLOAD_RECORD = re.compile(r"\{((?:[^{}']|'[^']*')*)\}")
+_PAYLOAD_PAIR = re.compile(r"'([^']*)'\s*:\s*(?:'([^']*)'|([^\s,'\"}]+))")
+
+
+class CourseColumnBuffer:
+    """
+    Accumulates course records column by column so a whole combination
+    becomes one DataFrame instead of one frame per page plus a concat.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def append(self, record):
+        """Append one record, padding columns it does not have"""
+        for key, value in record.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.rows
+            column.append(value)
+        self.rows += 1
+        if len(record) != len(self.columns):
+            self._pad()
+
+    def extend(self, other):
+        """Append every row of another buffer"""
+        for key, values in other.columns.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.rows
+            column.extend(values)
+        self.rows += other.rows
+        if len(other.columns) != len(self.columns):
+            self._pad()
+
+    def _pad(self):
+        for column in self.columns.values():
+            if len(column) < self.rows:
+                column.extend([None] * (self.rows - len(column)))
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns)
+
+
+def _decode_payload_string(value):
+    if '"' in value:
+        value = value.replace('"', '')
+    if '\\' in value:
+        value = json.loads(f'"{value}"')
+    if '<br><br>' in value:
+        value = value.replace('<br><br>', ' - ')
+    return value
+
+
+def iter_course_records(text):
+    """
+    Yield the course records of a getCourses payload one at a time.
+
+    The portal sends a JSON-like array of flat objects quoted with single
+    quotes. Records are decoded straight from the response text, without
+    first rewriting the quoting into a JSON copy of the whole payload.
+    Raises ValueError on anything other than an array of flat objects.
+    """
+    start = text.lstrip()
+    if not start.startswith('['):
+        raise ValueError("Payload is not an array")
+    # Everything between records must be a separator, so a nested object or
+    # a stray brace is rejected instead of silently cutting a record short
+    position = len(text) - len(start) + 1
+    records = 0
+    for match in _PAYLOAD_RECORD.finditer(text, position):
+        if text[position:match.start()].replace('"', '').strip() != (',' if records else ''):
+            raise ValueError("Unexpected text between course records")
+        position = match.end()
+        body = match.group(1)
+        if '[' in body:
+            raise ValueError("Nested array in course record")
+        record = {}
+        for key, quoted, bare in _PAYLOAD_PAIR.findall(body):
+            if bare:
+                record[key] = json.loads(bare)
+            elif '"' in quoted or '\\' in quoted or '<br>' in quoted:
+                record[key] = _decode_payload_string(quoted)
+            else:
+                record[key] = quoted
+        records += 1
+        yield record
+    if text[position:].replace('"', '').strip() != ']':
+        raise ValueError("Unexpected text after course records")
+
+
+def parse_courses_payload(text, buffer=None):
+    """
+    Parse a getCourses payload into a CourseColumnBuffer (appending to buffer when given).
+    Falls back to the old rewrite-then-json.loads path for payloads the streaming parser rejects.
+    """
+    buffer = CourseColumnBuffer() if buffer is None else buffer
+    page = CourseColumnBuffer()
+    try:
+        for record in iter_course_records(text):
+            page.append(record)
+    except ValueError as e:
+        logging.warning(f"Falling back to full JSON parse of getCourses payload: {e}")
+        page = CourseColumnBuffer()
+        for record in json.loads(text.replace('"', '').replace("'", '"').replace(
+                '<br><br>', ' - ')):
+            page.append(record)
+    buffer.extend(page)
+    return buffer
+
+
+def course_keys(index):
+    """Render a course_index as 'name|sectionNo' strings, suffixed with the occurrence for repeated keys"""
+    keys = []
+    for values in index:
+        *parts, occurrence = values
+        key = '|'.join(str(part) for part in parts)
+        keys.append(f"{key}|{occurrence}" if occurrence else key)
+    return keys
+
+
+class CourseStore:
+    """
+    SQLite store with one row per course section and an append-only change log.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS sections (
+            combination TEXT NOT NULL,
+            course_key TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (combination, course_key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS sections_course_key ON sections (course_key);
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            combination TEXT NOT NULL,
+            course_key TEXT NOT NULL,
+            change_type TEXT NOT NULL,
+            field TEXT,
+            old_value TEXT,
+            new_value TEXT,
+            changed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS changes_course_key ON changes (course_key, changed_at);
+        CREATE INDEX IF NOT EXISTS changes_combination ON changes (combination, changed_at);
+        CREATE INDEX IF NOT EXISTS changes_changed_at ON changes (changed_at);
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            department TEXT,
+            course TEXT,
+            section TEXT,
+            lecturer TEXT,
+            columns TEXT,
+            transition TEXT,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS subscriptions_chat_id ON subscriptions (chat_id);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Writes run on a single executor thread; the connection is shared with it
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA busy_timeout=5000')
+        self.connection.executescript(self.schema)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def _section_rows(combination, df, index, positions, timestamp):
+        records = df.astype(str).to_dict('records')
+        return [(combination, key, int(position),
+                 json.dumps(record, ensure_ascii=False), timestamp)
+                for key, position, record in zip(course_keys(index), positions, records)]
+
+    def load_snapshot(self, combination):
+        """Return the stored DataFrame of one combination, or None when it has none"""
+        rows = self.connection.execute(
+            'SELECT data FROM sections WHERE combination = ? ORDER BY position',
+            (combination,)).fetchall()
+        if not rows:
+            return None
+        return pd.DataFrame([json.loads(data) for data, in rows])
+
+    def replace_snapshot(self, combination, df, timestamp=None):
+        """Store a whole snapshot as the baseline of a combination, without logging changes"""
+        timestamp = timestamp or time.time()
+        with self.connection:
+            self.connection.execute('DELETE FROM sections WHERE combination = ?',
+                                    (combination,))
+            self.connection.executemany(
+                'INSERT INTO sections VALUES (?, ?, ?, ?, ?)',
+                self._section_rows(combination, df, course_index(df),
+                                   range(len(df)), timestamp))
+
+    def apply_changeset(self, combination, new_df, changeset, shifts=(), timestamp=None):
+        """
+        Upsert the added and modified sections, delete removed ones and log
+        every change. shifts holds the (start, stop, delta) position ranges of
+        position_shifts(), for kept rows moved by rows added or removed
+        before them.
+        """
+        timestamp = timestamp or time.time()
+        new_index = course_index(new_df)
+        added = changeset['added']
+        modified = changeset['modified']
+        key_names = list(new_index.names)
+        modified_index = pd.MultiIndex.from_frame(
+            modified[key_names].drop_duplicates()) if not modified.empty else new_index[:0]
+        changed_index = added.index.append(modified_index)
+        positions = new_index.get_indexer(changed_index)
+        changed_rows = new_df.iloc[positions]
+
+        removed_keys = course_keys(changeset['removed'].index)
+        log = [(combination, key, 'added', None, None, None, timestamp)
+               for key in course_keys(added.index)]
+        log += [(combination, key, 'removed', None, None, None, timestamp)
+                for key in removed_keys]
+        modified_keys = course_keys(modified[key_names].itertuples(index=False, name=None))
+        log += [(combination, key, 'modified', field, str(old), str(new), timestamp)
+                for key, field, old, new in zip(modified_keys, modified['column'],
+                                                modified['old'], modified['new'])]
+
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM sections WHERE combination = ? AND course_key = ?',
+                [(combination, key) for key in removed_keys])
+            # Shifted rows go through negative positions, so no row is moved twice
+            for start, stop, delta in shifts:
+                self.connection.execute(
+                    'UPDATE sections SET position = -1 - (position + ?) '
+                    'WHERE combination = ? AND position >= ? AND position < ?',
+                    (delta, combination, start, stop))
+            if shifts:
+                self.connection.execute(
+                    'UPDATE sections SET position = -1 - position '
+                    'WHERE combination = ? AND position < 0', (combination,))
+            # new_df may be a slice of the catalog indexed by catalog position
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?)',
+                self._section_rows(combination, changed_rows, changed_index,
+                                   new_df.index[positions], timestamp))
+            self.connection.executemany(
+                'INSERT INTO changes (combination, course_key, change_type, field, '
+                'old_value, new_value, changed_at) VALUES (?, ?, ?, ?, ?, ?, ?)', log)
+
+    def history(self, course_key=None, combination=None, since=None):
+        """Return logged changes, newest first, filtered by course key, combination and time"""
+        clauses, params = [], []
+        for column, value in (('course_key', course_key), ('combination', combination)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append('changed_at >= ?')
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return pd.read_sql_query(
+            f'SELECT * FROM changes {where} ORDER BY changed_at DESC, id DESC',
+            self.connection, params=params)
+
+    def add_subscription(self, chat_id, department=None, course=None, section=None,
+                         lecturer=None, columns=None, transition=None):
+        """
+        Subscribe a chat to the changes matching every given filter and return its id.
+        columns is a list of column names and/or 'added'/'removed'; transition
+        is 'old>new' in status names ('*' matches any) or one of
+        subscription_transitions.
+        """
+        if transition is not None:
+            parse_transition(transition)
+        if columns is not None and not isinstance(columns, str):
+            columns = ','.join(columns)
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO subscriptions (chat_id, department, course, section, '
+                'lecturer, columns, transition, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (str(chat_id), department, course, section, lecturer, columns,
+                 transition, time.time()))
+        return cursor.lastrowid
+
+    def remove_subscriptions(self, subscription_id=None, chat_id=None):
+        """Delete one subscription by id, or every subscription of a chat; returns how many were removed"""
+        if subscription_id is None and chat_id is None:
+            raise ValueError("Give a subscription_id or a chat_id")
+        column, value = (('id', subscription_id) if subscription_id is not None
+                         else ('chat_id', str(chat_id)))
+        with self.connection:
+            return self.connection.execute(
+                f'DELETE FROM subscriptions WHERE {column} = ?', (value,)).rowcount
+
+    def load_subscriptions(self, chat_id=None):
+        """Return every subscription (or those of one chat) as dicts"""
+        query = 'SELECT * FROM subscriptions'
+        params = ()
+        if chat_id is not None:
+            query += ' WHERE chat_id = ?'
+            params = (str(chat_id),)
+        cursor = self.connection.execute(query + ' ORDER BY id', params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def subscriptions_version(self):
+        """Cheap fingerprint that changes whenever subscriptions are added or removed"""
+        return self.connection.execute(
+            'SELECT count(*), coalesce(max(id), 0) FROM subscriptions').fetchone()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.connection.close()
+
+
+class CourseStatus(enum.IntEnum):
+    """Seat status of a course section as sent by the portal"""
+    UNKNOWN = 0
+    AVAILABLE = 1
+    CANCELLED = 2
+    CLOSED = 3
+
+
+# Named status transitions accepted by subscriptions
+subscription_transitions = {
+    'seat_opened': '*>available',
+    'seat_closed': '*>closed',
+    'cancelled': '*>cancelled',
+}
+
+
+def parse_transition(transition):
+    """Return (old, new) CourseStatus names for a subscription transition, None meaning any"""
+    transition = subscription_transitions.get(transition, transition)
+    try:
+        old, new = (part.strip().lower() for part in transition.split('>'))
+    except ValueError:
+        raise ValueError(f"Invalid status transition: {transition!r}")
+    names = {status.name.lower() for status in CourseStatus}
+    for part in (old, new):
+        if part != '*' and part not in names:
+            raise ValueError(f"Unknown course status in transition: {part!r}")
+    return (None if old == '*' else old), (None if new == '*' else new)
+
+
+def status_code(value):
+    """Decode one portal status value ('1', 1, 1.0, ...) to its CourseStatus, UNKNOWN when unrecognised"""
+    try:
+        return CourseStatus(int(float(value)))
+    except (TypeError, ValueError, OverflowError):
+        return CourseStatus.UNKNOWN
+
+
+def status_codes(values):
+    """Vectorized status_code: an int8 array of CourseStatus codes"""
+    codes = pd.to_numeric(values if isinstance(values, pd.Series)
+                          else pd.Series(values, dtype=object), errors='coerce')
+    codes = codes.where(codes.isin(list(CourseStatus)), CourseStatus.UNKNOWN)
+    return codes.to_numpy().astype('int8')
+
+
+def _status_name(value):
+    return status_code(value).name.lower()
+
+
+def _fold(value):
+    return str(value).strip().casefold()
+
+
+class SubscriptionIndex:
+    """
+    Inverted index of chat subscriptions.
+
+    Each subscription is filed under its most selective filter (course,
+    then lecturer, then department), or in the catch-all set when it has
+    none of them. A change only looks at the subscriptions filed under its
+    own course, lecturers and department plus the catch-all ones, and
+    checks their remaining filters, so matching costs O(candidates) rather
+    than O(subscriptions).
+    """
+
+    anchors = ('course', 'lecturer', 'department')
+
+    def __init__(self, subscriptions=()):
+        self.subscriptions = {}
+        self.index = {}
+        self.catch_all = set()
+        self.chats = set()
+        for subscription in subscriptions:
+            self.add(subscription)
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def add(self, subscription):
+        subscription = dict(subscription)
+        subscription['chat_id'] = str(subscription['chat_id'])
+        columns = subscription.get('columns')
+        subscription['columns'] = (set(column.strip() for column in columns.split(','))
+                                   if columns else None)
+        transition = subscription.get('transition')
+        subscription['transition'] = parse_transition(transition) if transition else None
+        for field in ('department', 'course', 'section', 'lecturer'):
+            if subscription.get(field):
+                subscription[field] = _fold(subscription[field])
+        self.subscriptions[subscription['id']] = subscription
+        self.chats.add(subscription['chat_id'])
+        for field in self.anchors:
+            if subscription.get(field):
+                self.index.setdefault((field, subscription[field]), set()).add(
+                    subscription['id'])
+                break
+        else:
+            self.catch_all.add(subscription['id'])
+
+    def match(self, departments, change_type, course, section, lecturers=(),
+              column=None, old=None, new=None):
+        """
+        Return the chat ids subscribed to one change. departments holds the
+        name and id of the combination's department, lecturers every lecturer
+        value involved in the change.
+        """
+        course = _fold(course)
+        section = _fold(section)
+        departments = {_fold(department) for department in departments}
+        lecturers = {_fold(lecturer) for lecturer in lecturers if lecturer}
+        candidates = set(self.catch_all)
+        for key in ([('course', course)]
+                    + [('lecturer', lecturer) for lecturer in lecturers]
+                    + [('department', department) for department in departments]):
+            candidates.update(self.index.get(key, ()))
+
+        chat_ids = set()
+        for subscription_id in candidates:
+            subscription = self.subscriptions[subscription_id]
+            if subscription['chat_id'] in chat_ids:
+                continue
+            if subscription.get('course') and subscription['course'] != course:
+                continue
+            if subscription.get('section') and subscription['section'] != section:
+                continue
+            if subscription.get('department') and subscription['department'] not in departments:
+                continue
+            if subscription.get('lecturer') and subscription['lecturer'] not in lecturers:
+                continue
+            kind = column if change_type == 'modified' else change_type
+            if subscription['columns'] is not None and kind not in subscription['columns']:
+                continue
+            if subscription['transition'] is not None:
+                if column != 'status':
+                    continue
+                old_status, new_status = subscription['transition']
+                if old_status and _status_name(old) != old_status:
+                    continue
+                if new_status and _status_name(new) != new_status:
+                    continue
+            chat_ids.add(subscription['chat_id'])
+        return chat_ids
+
+
+def apply_course_schema(df):
+    """
+    Convert a normalized course snapshot to its compact dtypes: status as an
+    int8 CourseStatus code and every other text column as a categorical,
+    since names, days, times, rooms and lecturers repeat heavily.
+    """
+    for column in df.columns:
+        if column == 'status':
+            df[column] = status_codes(df[column])
+        else:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def course_index(df, key_columns=None):
+    """
+    Build a unique index from the course key columns of a dataframe.
+    Repeated keys are told apart by their order of appearance.
+    """
+    key_columns = [column for column in (key_columns or course_key_columns)
+                   if column in df.columns]
+    occurrence = df.groupby(key_columns, sort=False,
+                            observed=True).cumcount().to_numpy()
+    return pd.MultiIndex.from_arrays(
+        [df[column].array for column in key_columns] + [occurrence],
+        names=key_columns + ['occurrence'])
+
+
+def diff_course_frames(new_df, old_df, key_columns=None):
+    """
+    Diff two course snapshots by course key instead of by row position.
+
+    Returns a changeset dict with the 'added' and 'removed' rows, indexed
+    by course key, and a 'modified' frame holding one row per changed
+    field: the key columns and occurrence, the 'column' name and its 'old'
+    and 'new' values, ordered by column. When the snapshots have a
+    'lecturers' column, each modified row also carries the section's
+    current 'lecturers', so lecturer subscriptions match changes to any column.
+    """
+    new_index = course_index(new_df, key_columns)
+    old_index = course_index(old_df, key_columns)
+    key_names = list(new_index.names)
+
+    added_mask = ~new_index.isin(old_index)
+    removed_mask = ~old_index.isin(new_index)
+
+    compare_columns = [column for column in new_df.columns
+                       if column in old_df.columns and column not in key_names]
+    new_df = new_df.set_axis(new_index)
+    old_df = old_df.set_axis(old_index)
+    common = new_index[~added_mask]
+    new_values = new_df[~added_mask]
+    old_values = old_df.reindex(common)
+
+    carry_lecturers = 'lecturers' in new_df.columns and 'lecturers' not in key_names
+
+    # Columns are compared one at a time on their codes, so changes come out grouped per field
+    parts = []
+    for column in compare_columns:
+        new_column, old_column = new_values[column], old_values[column]
+        row_pos = np.flatnonzero(column_changes(new_column, old_column))
+        if not len(row_pos):
+            continue
+        part = pd.DataFrame({
+            name: common.get_level_values(name)[row_pos] for name in key_names
+        })
+        part['column'] = column
+        part['old'] = old_column.iloc[row_pos].to_numpy(dtype=object)
+        part['new'] = new_column.iloc[row_pos].to_numpy(dtype=object)
+        if carry_lecturers:
+            part['lecturers'] = new_values['lecturers'].iloc[row_pos].to_numpy(dtype=object)
+        parts.append(part)
+    if parts:
+        modified = pd.concat(parts, ignore_index=True)
+    else:
+        modified = pd.DataFrame(columns=key_names + ['column', 'old', 'new']
+                                + (['lecturers'] if carry_lecturers else []))
+
+    return {
+        'added': new_df[added_mask],
+        'removed': old_df[removed_mask],
+        'modified': modified,
+    }
+
+
+def course_key_counts(df, key_columns=None):
+    """Count the rows of every course key (the key columns without occurrence) in a frame"""
+    key_columns = [column for column in (key_columns or course_key_columns)
+                   if column in df.columns]
+    return collections.Counter(zip(*(df[column] for column in key_columns)))
+
+
+def splice_course_frames(old_df, new_df, take):
+    """
+    Build a frame from rows of two schema frames with the same columns.
+    take holds positions into old_df's rows followed by new_df's rows (offset
+    by len(old_df)). Categorical columns keep old_df's codes, with new_df's
+    extra categories appended, so unchanged rows are copied without recoding.
+    """
+    columns = {}
+    for column in old_df.columns:
+        old_column, new_column = old_df[column], new_df[column]
+        if (isinstance(old_column.dtype, pd.CategoricalDtype)
+                and isinstance(new_column.dtype, pd.CategoricalDtype)):
+            categories = old_column.cat.categories
+            extra = new_column.cat.categories.difference(categories)
+            if len(extra):
+                categories = categories.append(extra)
+            new_codes = pd.Categorical(new_column, categories=categories).codes
+            codes = np.concatenate([old_column.cat.codes.to_numpy(), new_codes])
+            columns[column] = pd.Categorical.from_codes(codes[take], categories=categories)
+        else:
+            values = np.concatenate([old_column.to_numpy(), new_column.to_numpy()])
+            columns[column] = values[take]
+    return pd.DataFrame(columns, columns=old_df.columns)
+
+
+def column_changes(new_column, old_column):
+    """
+    Return a boolean array marking rows whose value differs between two aligned columns.
+    Categorical columns are compared on their integer codes over shared categories.
+    """
+    if (isinstance(new_column.dtype, pd.CategoricalDtype)
+            and isinstance(old_column.dtype, pd.CategoricalDtype)):
+        if not new_column.cat.categories.equals(old_column.cat.categories):
+            categories = new_column.cat.categories.union(old_column.cat.categories)
+            new_column = new_column.cat.set_categories(categories)
+            old_column = old_column.cat.set_categories(categories)
+        return new_column.cat.codes.to_numpy() != old_column.cat.codes.to_numpy()
+    return new_column.to_numpy() != old_column.to_numpy()
+
+
+def position_shifts(old_positions, new_positions):
+    """
+    Compress the moves of kept rows, given as their old and new catalog
+    positions, into (start, stop, delta) ranges of old positions that all
+    move by the same delta. Rows that did not move are left out.
+    """
+    old_positions = np.asarray(old_positions, dtype=np.int64)
+    order = np.argsort(old_positions, kind='stable')
+    old = old_positions[order]
+    delta = np.asarray(new_positions, dtype=np.int64)[order] - old
+    if not len(old):
+        return []
+    breaks = np.flatnonzero((np.diff(delta) != 0) | (np.diff(old) != 1)) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(old)]])
+    return [(int(old[start]), int(old[stop - 1]) + 1, int(delta[start]))
+            for start, stop in zip(starts, stops) if delta[start]]
+
+
+def combination_name(college_name, degree_name, department_name):
+    """Name of a combination's snapshot, without the .csv of its legacy file"""
+    return f"Course_Data - {college_name}_{degree_name}_{department_name}"
+
+
+def changeset_is_empty(changeset):
+    """Return True when a changeset holds no added, removed or modified rows"""
+    return all(changeset[part].empty for part in ('added', 'removed', 'modified'))
+
+
+class PortalError(Exception):
+    """A getCourses request failed; retryable says whether trying again may help"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SessionExpiredError(PortalError):
+    """The portal answered with its login page or refused the session cookie"""
+
+    def __init__(self, message, generation):
+        super().__init__(message)
+        self.generation = generation
+
+
+class CircuitOpenError(PortalError):
+    """The portal circuit breaker is open and requests fail fast"""
+
+    def __init__(self, message):
+        super().__init__(message, retryable=False)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one remote host.
+
+    Closed: requests pass and failures are counted. Open: requests fail
+    fast with CircuitOpenError until reset_timeout has passed. Half open:
+    a single trial request is let through; its success closes the circuit
+    and its failure opens it again.
+
+    Worker processes share shared_open_until (a multiprocessing.Value
+    holding a time.time() deadline): a circuit opened in one worker makes
+    the others fail fast as well until its reset_timeout has passed.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout, shared_open_until=None):
+        self.name = name
+        self.shared_open_until = shared_open_until
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if (self.state == 'closed' and self.shared_open_until is not None
+                and time.time() < self.shared_open_until.value):
+            raise CircuitOpenError(f"Circuit for {self.name} is open in another worker")
+        if self.state == 'open':
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit for {self.name} is open")
+            self.state = 'half_open'
+            self.trial_in_flight = False
+        if self.state == 'half_open':
+            if self.trial_in_flight:
+                raise CircuitOpenError(f"Circuit for {self.name} is half open")
+            self.trial_in_flight = True
+
+    def release_trial(self):
+        """Forget an admitted request that ended without a verdict (cancelled, not failed)"""
+        if self.state == 'half_open':
+            self.trial_in_flight = False
+
+    def record_success(self):
+        if self.state != 'closed':
+            logging.info(f"Circuit for {self.name} closed")
+        self.state = 'closed'
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or (
+                self.state == 'closed' and self.failures >= self.failure_threshold):
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+            self.times_opened += 1
+            if self.shared_open_until is not None:
+                self.shared_open_until.value = time.time() + self.reset_timeout
+            logging.warning(f"Circuit for {self.name} opened after {self.failures} "
+                            f"failure(s), pausing requests for {self.reset_timeout}s")
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter with burst capacity and AIMD rate adjustment.
+    """
+
+    def __init__(self, name, rate, burst, min_rate, max_rate, increase_step,
+                 decrease_factor, target_latency):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase_step = float(increase_step)
+        self.decrease_factor = float(decrease_factor)
+        self.target_latency = float(target_latency)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.last_decrease = 0
+        self.queue_depth = 0
+        self.throttle_events = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Take one token, waiting for the bucket to refill if it is empty"""
+        self._refill()
+        # Tokens may go negative: each waiter reserves its own slot up front,
+        # so concurrent callers queue in order instead of racing on a refill
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return
+        self.queue_depth += 1
+        try:
+            await asyncio.sleep(-self.tokens / self.rate)
+        except asyncio.CancelledError:
+            self.tokens += 1
+            raise
+        finally:
+            self.queue_depth -= 1
+
+    def record(self, latency=None, status_code=None, error=False):
+        """Adjust the rate from an observed response (additive increase, multiplicative decrease)"""
+        self._refill()
+        overloaded = (error or status_code == 429
+                      or (status_code is not None and status_code >= 500)
+                      or (latency is not None and latency > self.target_latency))
+        if not overloaded:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+            return
+        # Back off at most once per second so a burst of failures from the
+        # same congested window is not counted several times
+        now = time.monotonic()
+        if now - self.last_decrease >= 1:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.last_decrease = now
+            self.throttle_events += 1
+            logging.warning(
+                f"Rate limiter '{self.name}' backing off to {self.rate:.2f} req/s "
+                f"(status={status_code}, latency={latency})")
+
+    def metrics(self):
+        """Return the live state of the bucket"""
+        self._refill()
+        return {
+            'rate': round(self.rate, 3),
+            'tokens': round(self.tokens, 3),
+            'queue_depth': self.queue_depth,
+            'throttle_events': self.throttle_events,
+        }
+
+
+def _parse_window_time(value):
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid registration window time: {value!r}")
+
+
+def registration_window_interval(now=None, windows=None):
+    """Return the polling interval cap of the registration window open at now, or None"""
+    windows = schedule_settings['registration_windows'] if windows is None else windows
+    now = datetime.datetime.fromtimestamp(now or time.time())
+    caps = []
+    for window in windows:
+        if not _parse_window_time(window['start']) <= now <= _parse_window_time(window['end']):
+            continue
+        if window.get('daily'):
+            start, end = (datetime.datetime.strptime(part.strip(), '%H:%M').time()
+                          for part in window['daily'].split('-'))
+            if not start <= now.time() <= end:
+                continue
+        caps.append(window['interval'])
+    return min(caps) if caps else None
+
+
+class PollScheduler:
+    """
+    Priority queue of combinations keyed on their next due time.
+
+    Each combination keeps its own interval: record() shortens it after a
+    change and backs it off after quiet or failed polls, as set in
+    schedule_settings. The effective poll rate of every combination is
+    measured over its recent polls.
+    """
+
+    def __init__(self, combinations, settings=None, seed=None):
+        self.settings = dict(schedule_settings, **(settings or {}))
+        self.rng = random.Random(seed)
+        self.heap = []
+        self.state = {}
+        now = time.time()
+        for combination in combinations:
+            name = combination[-1]
+            self.state[name] = {
+                'combination': combination,
+                'interval': float(self.settings['base_interval']),
+                'quiet_polls': 0,
+                'failures': 0,
+                'polls': collections.deque(maxlen=20),
+            }
+            # Spread the first polls so combinations do not start in lockstep
+            self._push(name, now + self.rng.uniform(
+                0, self.settings['jitter'] * self.settings['base_interval']))
+
+    def _push(self, name, due):
+        self.state[name]['due'] = due
+        heapq.heappush(self.heap, (due, name))
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now=None):
+        """Remove and return every combination that is due"""
+        now = now or time.time()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, name = heapq.heappop(self.heap)
+            due.append(self.state[name]['combination'])
+        return due
+
+    def record(self, combination, outcome, now=None):
+        """
+        Reschedule a combination after a poll. outcome is 'changed',
+        'unchanged' or 'error'.
+        """
+        now = now or time.time()
+        settings = self.settings
+        state = self.state[combination[-1]]
+        state['polls'].append(now)
+        interval = state['interval']
+        if outcome == 'changed':
+            state['quiet_polls'] = state['failures'] = 0
+            interval = settings['min_interval']
+        elif outcome == 'error':
+            state['failures'] += 1
+            interval *= settings['failure_backoff_factor']
+        else:
+            state['failures'] = 0
+            state['quiet_polls'] += 1
+            if state['quiet_polls'] >= settings['quiet_polls_before_backoff']:
+                interval *= settings['backoff_factor']
+        interval = min(max(interval, settings['min_interval']), settings['max_interval'])
+        state['interval'] = interval
+
+        window_interval = registration_window_interval(
+            now, settings['registration_windows'])
+        if window_interval is not None:
+            interval = min(interval, window_interval)
+        jitter = settings['jitter']
+        self._push(combination[-1],
+                   now + interval * (1 + self.rng.uniform(-jitter, jitter)))
+
+    def rates(self, now=None):
+        """
+        Return {combination name: {'interval', 'polls_per_minute', 'due_in'}},
+        the rate being measured over the recent polls.
+        """
+        now = now or time.time()
+        rates = {}
+        for name, state in self.state.items():
+            polls = state['polls']
+            per_minute = None
+            if len(polls) > 1 and polls[-1] > polls[0]:
+                per_minute = 60 * (len(polls) - 1) / (polls[-1] - polls[0])
+            rates[name] = {
+                'interval': round(state['interval'], 3),
+                'polls_per_minute': None if per_minute is None else round(per_minute, 3),
+                'due_in': round(state['due'] - now, 3),
+            }
+        return rates
+
+
+class _Timer:
+    """Context manager that observes its elapsed time into a histogram"""
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start,
+                              **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and fixed-bucket histograms keyed by metric name and
+    labels, rendered in the Prometheus text exposition format.
+
+    Counters and histograms are additive, so a worker process can drain()
+    what it recorded since the last call and the notifier can merge() it.
+    """
+
+    def __init__(self, prefix='bau', buckets=None):
+        self.prefix = prefix
+        self.buckets = tuple(buckets or metrics_settings['latency_buckets'])
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = {
+                'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        histogram['buckets'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    def time(self, name, **labels):
+        """Time a block into the histogram name: with metrics.time('stage_seconds', stage='parse'):"""
+        return _Timer(self, name, labels)
+
+    def drain(self):
+        """Return the counters and histograms recorded since the last call (resetting them) and the current gauges"""
+        snapshot = {'counters': self.counters, 'histograms': self.histograms,
+                    'gauges': dict(self.gauges)}
+        self.counters = {}
+        self.histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a drain() snapshot from another registry with the same buckets; its gauges replace ours"""
+        self.gauges.update(snapshot.get('gauges', {}))
+        for key, value in snapshot['counters'].items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, other in snapshot['histograms'].items():
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.histograms[key] = {'buckets': list(other['buckets']),
+                                        'sum': other['sum'], 'count': other['count']}
+                continue
+            histogram['buckets'] = [mine + theirs for mine, theirs in
+                                    zip(histogram['buckets'], other['buckets'])]
+            histogram['sum'] += other['sum']
+            histogram['count'] += other['count']
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                   for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value
+                              in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+            for name in sorted({name for name, _ in series}):
+                lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+                for (metric, labels), value in sorted(series.items()):
+                    if metric == name:
+                        lines.append(f"{self.prefix}_{name}"
+                                     f"{self._format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {self.prefix}_{name} histogram")
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), histogram['buckets']):
+                    cumulative += count
+                    lines.append(f"{self.prefix}_{name}_bucket"
+                                 f"{self._format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.prefix}_{name}_sum{self._format_labels(labels)} "
+                             f"{histogram['sum']:.6f}")
+                lines.append(f"{self.prefix}_{name}_count{self._format_labels(labels)} "
+                             f"{histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Format log records as one JSON object per line, including any extra= fields"""
+
+    _reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'process': record.processName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._reserved:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_json_logging(path=None):
+    """Also write every log record to path as JSON lines"""
+    path = path or metrics_settings['json_log_path']
+    if not path:
+        return
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(JsonLogFormatter())
+    logging.getLogger().addHandler(handler)
+
+
+class NotificationDispatcher:
+    """
+    Background send queues for change notifications.
+
+    Messages added during a sweep are held until flush(), then packed per
+    chat into as few Telegram messages as fit the length limit and handed to
+    that chat's sender task, which sends them while the next sweep runs.
+    Every chat has its own queue and sender, so one chat's rate limit or
+    flood wait only delays that chat. A message repeated for the same chat
+    within one sweep is only sent once; the same change detected again in a
+    later sweep is a real event and is sent again. A chat of None stands for
+    every chat in default_chat_ids.
+    """
+
+    def __init__(self, send, notification_settings, default_chat_ids=()):
+        self.send = send
+        self.notification_settings = notification_settings
+        self.default_chat_ids = default_chat_ids
+        self.queues = {}
+        self.workers = {}
+        self.pending = {}
+        # (message, chat) pairs already queued in the current sweep
+        self.seen = set()
+
+    def qsize(self):
+        """Number of packed messages waiting in every chat's queue"""
+        return sum(chat_queue.qsize() for chat_queue in self.queues.values())
+
+    def _enqueue(self, message, chat_id):
+        for chat in (self.default_chat_ids if chat_id is None else [chat_id]):
+            if chat not in self.queues:
+                self.queues[chat] = asyncio.Queue()
+            worker = self.workers.get(chat)
+            if worker is None or worker.done():
+                self.workers[chat] = asyncio.ensure_future(self._run(chat))
+            self.queues[chat].put_nowait(message)
+
+    def add(self, message, chat_ids=(None,)):
+        """Queue a notification for the given chats, or hold it until the end of the sweep when batching"""
+        for chat_id in chat_ids:
+            key = (message, chat_id)
+            if key in self.seen:
+                logging.info(f"Skipping duplicate notification in this sweep: {message[:80]}")
+                continue
+            self.seen.add(key)
+            if self.notification_settings.get('batch_notifications', False):
+                self.pending.setdefault(chat_id, []).append(message)
+            else:
+                for chunk in pack_messages([message]):
+                    self._enqueue(chunk, chat_id)
+
+    async def flush(self):
+        """Pack the notifications collected during the sweep and hand them to the senders"""
+        if self.pending:
+            pending, self.pending = self.pending, {}
+            for chat_id, messages in pending.items():
+                for packed in pack_messages(messages):
+                    self._enqueue(packed, chat_id)
+        self.seen = set()
+
+    async def _run(self, chat_id):
+        chat_queue = self.queues[chat_id]
+        while True:
+            message = await chat_queue.get()
+            try:
+                await self.send(message, [chat_id])
+            except Exception as e:
+                logging.error(f"Error in notification dispatcher: {e}")
+            finally:
+                chat_queue.task_done()
+
+    async def close(self, timeout=30):
+        """Send whatever is still queued, then stop the senders"""
+        await self.flush()
+        if self.workers:
+            try:
+                await asyncio.wait_for(asyncio.gather(
+                    *(chat_queue.join() for chat_queue in self.queues.values())), timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Dropping {self.qsize()} queued notification(s) on shutdown")
+            for worker in self.workers.values():
+                worker.cancel()
+            self.workers = {}
+
+
+def pack_messages(messages, max_length=None, separator=None):
+    """
+    Combine messages into as few texts as possible without exceeding the Telegram length limit.
+    A single message longer than the limit is split on line breaks.
+    """
+    max_length = max_length or dispatch_settings['max_message_length']
+    separator = dispatch_settings['message_separator'] if separator is None else separator
+    packed = []
+    current = ''
+    for message in messages:
+        for part in _split_message(message, max_length):
+            if current and len(current) + len(separator) + len(part) <= max_length:
+                current += separator + part
+            else:
+                if current:
+                    packed.append(current)
+                current = part
+    if current:
+        packed.append(current)
+    return packed
+
+
+def _split_message(message, max_length):
+    if len(message) <= max_length:
+        return [message]
+    parts = []
+    current = ''
+    for line in message.split('\n'):
+        while len(line) > max_length:
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(line[:max_length])
+            line = line[max_length:]
+        if current and len(current) + 1 + len(line) > max_length:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+
+_MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+
+
+class MessageTemplate:
+    """
+    A message template compiled once into literal pieces and field names.
+
+    render() formats a whole batch at a time: each piece is appended to an
+    object array holding every message, so the Python-level work grows with
+    the number of pieces rather than the number of rows. Constant fields
+    are folded into the literals when the template is compiled.
+    """
+
+    def __init__(self, template, constants=None):
+        constants = constants or {}
+        self.pieces = []
+        literal = ''
+        for text, field, spec, conversion in string.Formatter().parse(template):
+            literal += text
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"Unsupported format spec in message template: {template!r}")
+            if field in constants:
+                literal += str(constants[field])
+                continue
+            self.pieces.append((literal, field))
+            literal = ''
+        self.pieces.append((literal, None))
+        self.fields = {field for _, field in self.pieces if field is not None}
+
+    def render(self, values, length):
+        """
+        Return an object array of length messages. values maps each field to
+        an array of length texts or a single text shared by every message.
+        """
+        messages = np.full(length, '', dtype=object)
+        for literal, field in self.pieces:
+            if literal:
+                messages += literal
+            if field is not None:
+                messages += values[field]
+        return messages
+
+
+class MessageRenderer:
+    """
+    Formats the parts of a changeset into notification texts using one set
+    of message_templates and message_labels.
+
+    Every column is turned into display text once per distinct value
+    (status codes decoded to labels, whitespace stripped, Markdown escaped)
+    and spread to the rows through the factorized codes, then the compiled
+    templates concatenate whole columns.
+    """
+
+    def __init__(self, message_format=None, language=None):
+        self.message_format = message_format or render_settings['format']
+        self.language = language or render_settings['language']
+        if self.message_format not in message_templates:
+            raise ValueError(f"Unknown message format: {self.message_format!r}")
+        if self.language not in message_labels:
+            raise ValueError(f"Unknown message language: {self.language!r}")
+        self.templates = message_templates[self.message_format]
+        self.labels = message_labels[self.language]
+        self.parse_mode = self.templates.get('parse_mode')
+        self.digest = 'heading' in self.templates
+        # Built on first use so creating the bot does not import numpy
+        self.status_text = None
+        self.compiled = {}
+
+    def escape(self, text):
+        if self.parse_mode == 'Markdown':
+            return _MARKDOWN_SPECIAL.sub(r'\\\1', text)
+        return text
+
+    def column_label(self, column):
+        return self.labels['columns'].get(column, column.title())
+
+    def title(self, change_type, column=None):
+        return self.labels[change_type].format(column=self.column_label(column or ''))
+
+    def template(self, name, change_type, column=None):
+        """Compile a template with the constant labels of a change type and column, once"""
+        key = (name, change_type, column)
+        if key not in self.compiled:
+            constants = {f"{field}_label": self.escape(label)
+                         for field, label in self.labels['columns'].items()}
+            column_label = self.column_label(column or '')
+            constants.update(
+                title=self.escape(self.title(change_type, column)),
+                previous_label=self.escape(self.labels['previous'].format(column=column_label)),
+                new_label=self.escape(self.labels['new'].format(column=column_label)),
+                label=self.escape(column_label))
+            self.compiled[key] = MessageTemplate(self.templates[name], constants)
+        return self.compiled[key]
+
+    def column_text(self, values, column):
+        """Display text of every value of a column"""
+        if column == 'status':
+            if self.status_text is None:
+                self.status_text = np.array(
+                    [self.escape(self.labels['status'][status.name.lower()])
+                     for status in CourseStatus], dtype=object)
+            return self.status_text[status_codes(values)]
+        codes, uniques = pd.factorize(values)
+        texts = [self.escape(str(value).strip()) for value in np.asarray(uniques, dtype=object)]
+        # Missing values get code -1, which picks the trailing ''
+        return np.array(texts + [''], dtype=object)[codes]
+
+    def render(self, change_type, frame, location, column=None):
+        """
+        Return one text per row of frame, which holds rows of the 'added' or
+        'removed' part of a changeset or the rows of one column of its
+        'modified' part. Digest formats return one line per row, to be
+        joined by digest_message().
+        """
+        template = self.template(change_type, change_type, column)
+        values = {'location': self.escape(location)}
+        for field in template.fields:
+            if field == 'fields':
+                values[field] = self.render_fields(change_type, frame)
+            elif field in ('old', 'new'):
+                values[field] = self.column_text(frame[field], column)
+            elif field in frame.columns:
+                values[field] = self.column_text(frame[field], field)
+            elif field != 'location':
+                values[field] = ''
+        return template.render(values, len(frame))
+
+    def render_fields(self, change_type, frame):
+        """One 'field' line per column of frame, joined by line breaks"""
+        lines = np.full(len(frame), '', dtype=object)
+        for position, column in enumerate(frame.columns):
+            field = self.template('field', change_type, column).render(
+                {'value': self.column_text(frame[column], column)}, len(frame))
+            lines = field if position == 0 else lines + '\n' + field
+        return lines
+
+    def digest_message(self, change_type, lines, location, column=None):
+        """Join the rendered lines of one change type and column under the digest heading"""
+        heading = self.template('heading', change_type, column).render(
+            {'count': str(len(lines)), 'location': self.escape(location)}, 1)[0]
+        return heading + '\n'.join(lines)
+
+
 class Telegram_Bot:
 
-    def __init__(self, bot_token, list_of_chat_ids, config_dict):
+    def __init__(self, bot_token, list_of_chat_ids, config_dict,
+                 http_client=None, portal_url=portal_url):
         self.bot_token = bot_token
         self.list_of_chat_ids = list_of_chat_ids
         self.config_dict = config_dict
-        self.application = Application.builder().token(bot_token).build()
-        self.bot = self.application.bot
+        # The Telegram client is created on first use; assign bot to use another client
+        self._bot = None
+
+        # Pooled keep-alive client shared across pages and iterations. Pass
+        # your own httpx.AsyncClient (or a different portal_url) to point the
+        # bot at a local stand-in server.
+        self.portal_url = portal_url
+        self.http_client = http_client
+        self._owns_http_client = http_client is None
+        self.session_lock = asyncio.Lock()
+        self.session_generation = 0
+        self.circuit_breaker = CircuitBreaker(urllib.parse.urlsplit(portal_url).hostname,
+                                              **circuit_breaker_settings)
 
         # New additions
-        self.request_semaphore = asyncio.Semaphore(5)
-        self.last_request_time = 0
-        self.min_request_interval = 1
+        self.request_semaphore = asyncio.Semaphore(
+            http_settings['max_concurrent_requests'])
+        self.combination_semaphore = asyncio.Semaphore(
+            fetch_settings['max_concurrent_combinations'])
+        self.rate_limiters = {
+            name: TokenBucket(name, **settings)
+            for name, settings in rate_limit_settings.items()
+        }
+        self.sweep_timings = {}
+        self.page_cache = {}
+        # Rows per page and rows per course key of every baseline, for page-level diffing
+        self.page_layouts = {}
+        self.snapshot_key_counts = {}
+        self.store = None
+        self.snapshots = {}
+        self.pending_writes = []
+        self.write_task = None
 
         self.notification_settings = {
             'status': True,
@@ -55,7 +1709,6 @@ class Telegram_Bot:
             'hours': True,
             'remarks': False,
             'batch_notifications': True,
-            'notification_cooldown': 300,
         }
 
         self.stats = {
@@ -66,12 +1719,133 @@ class Telegram_Bot:
             'errors_encountered': 0,
         }
 
-    async def _rate_limit(self):
-        """Ensure minimum time between requests"""
-        now = time.time()
-        if now - self.last_request_time < self.min_request_interval:
-            await asyncio.sleep(self.min_request_interval - (now - self.last_request_time))
-        self.last_request_time = time.time()
+        self.chat_rate_limiters = {}
+        self.renderer = MessageRenderer()
+        self.dispatcher = NotificationDispatcher(self.send_notification,
+                                                 self.notification_settings,
+                                                 self.list_of_chat_ids)
+        # Set in worker processes to ship changesets to the notifier process
+        self.changeset_sink = None
+        self.scheduler = None
+        self.subscriptions = None
+        self.subscriptions_version = None
+        self.subscriptions_checked = 0.0
+        self.combination_departments = None
+
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+
+    @property
+    def bot(self):
+        """The python-telegram-bot client, created (and imported) on first use"""
+        if self._bot is None:
+            from telegram import Bot
+            self._bot = Bot(self.bot_token)
+        return self._bot
+
+    @bot.setter
+    def bot(self, bot):
+        self._bot = bot
+
+    async def _rate_limit(self, api='portal'):
+        """Wait for a token from the rate limiter of the given API"""
+        await self.rate_limiters[api].acquire()
+
+    def record_error(self, where, error):
+        """Count an error in the stats and in the per-type error counter, and log it"""
+        self.stats['errors_encountered'] += 1
+        self.metrics.inc('errors_total', where=where, type=type(error).__name__)
+        logging.error(f"Error in {where}: {error}",
+                      extra={'event': 'error', 'where': where,
+                             'error_type': type(error).__name__})
+
+    def update_gauges(self):
+        """Refresh the gauges that mirror live state: stats, queues and rate limiters"""
+        for key, value in self.stats.items():
+            if key != 'start_time':
+                self.metrics.set(key, value)
+        self.metrics.set('uptime_seconds', round(time.time() - self.stats['start_time'], 3))
+        self.metrics.set('notification_queue_depth', self.dispatcher.qsize())
+        self.metrics.set('pending_store_writes', len(self.pending_writes))
+        self.metrics.set('circuit_open', int(self.circuit_breaker.state != 'closed'),
+                         host=self.circuit_breaker.name)
+        self.metrics.set('circuit_opened', self.circuit_breaker.times_opened,
+                         host=self.circuit_breaker.name)
+        limiters = dict(self.rate_limiters)
+        limiters.update(self.chat_rate_limiters)
+        for name, limiter in limiters.items():
+            state = limiter.metrics()
+            self.metrics.set('rate_limit_rate', state['rate'], limiter=name)
+            self.metrics.set('rate_limit_queue_depth', state['queue_depth'], limiter=name)
+            self.metrics.set('rate_limit_throttle_events', state['throttle_events'],
+                             limiter=name)
+
+    async def start_metrics_server(self, host=None, port=None):
+        """Serve the metrics registry on http://host:port/metrics"""
+        host = host or metrics_settings['host']
+        port = metrics_settings['port'] if port is None else port
+        if not port:
+            return None
+        self.metrics_server = await asyncio.start_server(self._serve_metrics, host, port)
+        print(f"Metrics available at http://{host}:{port}/metrics")
+        return self.metrics_server
+
+    async def _serve_metrics(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Skip the request headers
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                self.update_gauges()
+                status = '200 OK'
+                body = self.metrics.render().encode('utf-8')
+            else:
+                status = '404 Not Found'
+                body = b'Not Found\n'
+            writer.write(f"HTTP/1.1 {status}\r\n"
+                         f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+        except Exception as e:
+            logging.warning(f"Error serving metrics: {e}")
+        finally:
+            writer.close()
+
+    def _get_http_client(self):
+        """Return the shared HTTP client, creating the connection pool on first use"""
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=http_settings['max_connections'],
+                    max_keepalive_connections=http_settings['max_keepalive_connections']),
+                timeout=httpx.Timeout(http_settings['request_timeout'],
+                                      connect=http_settings['connect_timeout']))
+        return self.http_client
+
+    async def close(self):
+        """Send queued notifications, flush pending store writes and release the pooled HTTP connections"""
+        await self.dispatcher.close()
+        if self.write_task is not None:
+            self.write_task.cancel()
+        await self.flush_store_writes()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        if self.http_client is not None and self._owns_http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+        if self._bot is not None:
+            try:
+                await self._bot.shutdown()
+            except Exception as e:
+                logging.warning(f"Error shutting down the Telegram client: {e}")
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+            self.metrics_server = None
 
     async def send_health_report(self):
         """Send periodic health report to admins"""
@@ -84,140 +1858,221 @@ class Telegram_Bot:
             f"Notifications Sent: {self.stats['notifications_sent']}\n"
             f"Errors: {self.stats['errors_encountered']}"
         )
+        for name, limiter in self.rate_limiters.items():
+            metrics = limiter.metrics()
+            report += (f"\n{name.title()} rate: {metrics['rate']:.2f} req/s, "
+                       f"queue: {metrics['queue_depth']}")
+        report += f"\nNotification queue: {self.dispatcher.qsize()}"
+        if self.scheduler is not None:
+            rates = sorted(self.scheduler.rates().items(),
+                           key=lambda item: item[1]['interval'])
+            report += "\nFastest polled:"
+            for name, rate in rates[:5]:
+                report += (f"\n  {name.split('.')[0]}: every {rate['interval']:.1f}s"
+                           f" ({rate['polls_per_minute'] or 0:.1f}/min)")
         await self.send_telegram_message(report)
 
-    async def send_telegram_message(self, message):
+    async def send_telegram_message(self, message, chat_ids=None, parse_mode=None):
         """
-        Send a message to the Telegram bot.
+        Send a message to every chat (or the given chats) concurrently.
         """
-        for chat_id in self.list_of_chat_ids:
+        await asyncio.gather(*(self._send_to_chat(chat_id, message, parse_mode)
+                               for chat_id in chat_ids or self.list_of_chat_ids))
+
+    async def send_notification(self, message, chat_ids=None):
+        """Send a rendered change notification with the renderer's parse mode"""
+        await self.send_telegram_message(message, chat_ids, self.renderer.parse_mode)
+
+    async def _send_to_chat(self, chat_id, message, parse_mode=None):
+        """Send one message to one chat within the global and per-chat rate limits, retrying on flood control"""
+        from telegram.error import RetryAfter
+
+        limiter = self.rate_limiters['telegram']
+        if chat_id not in self.chat_rate_limiters:
+            self.chat_rate_limiters[chat_id] = TokenBucket(
+                f"chat {chat_id}", **chat_rate_limit_settings)
+        chat_limiter = self.chat_rate_limiters[chat_id]
+
+        for attempt in range(1, dispatch_settings['max_send_attempts'] + 1):
             try:
-                await self.bot.send_message(chat_id=chat_id, text=message)
+                await chat_limiter.acquire()
+                await self._rate_limit('telegram')
+                start = time.monotonic()
+                await self.bot.send_message(chat_id=chat_id, text=message,
+                                            parse_mode=parse_mode)
+                latency = time.monotonic() - start
+                limiter.record(latency)
+                chat_limiter.record(latency)
+                self.metrics.observe('stage_seconds', latency, stage='telegram_send')
                 self.stats['notifications_sent'] += 1
                 logging.info(f"Message sent to chat ID {chat_id}")
+                return True
+            except RetryAfter as e:
+                limiter.record(status_code=429)
+                chat_limiter.record(status_code=429)
+                self.metrics.inc('telegram_flood_waits_total')
+                retry_after = e.retry_after
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(
+                    f"Flood control for chat ID {chat_id}, retrying in {retry_after}s "
+                    f"(attempt {attempt})")
+                await asyncio.sleep(retry_after)
             except Exception as e:
-                self.stats['errors_encountered'] += 1
-                logging.error(
-                    f"Failed to send message to chat ID {chat_id}: {e}")
+                self.record_error('send_message', e)
+                return False
 
-    async def check_cell_changes_through_column_name(self, new_df, old_df,
+        self.stats['errors_encountered'] += 1
+        self.metrics.inc('errors_total', where='send_message', type='RetryAfter')
+        logging.error(f"Giving up on message to chat ID {chat_id} after "
+                      f"{dispatch_settings['max_send_attempts']} attempts")
+        return False
+
+    def get_subscriptions(self):
+        """Return the subscription index, reloading it when subscriptions changed in the store"""
+        now = time.monotonic()
+        if (self.subscriptions is None or now - self.subscriptions_checked
+                >= subscription_settings['reload_seconds']):
+            self.subscriptions_checked = now
+            try:
+                store = self.get_store()
+                version = store.subscriptions_version()
+                if version != self.subscriptions_version:
+                    self.subscriptions = SubscriptionIndex(store.load_subscriptions())
+                    self.subscriptions_version = version
+                    self.metrics.set('subscriptions', len(self.subscriptions))
+            except Exception as e:
+                self.record_error('get_subscriptions', e)
+                if self.subscriptions is None:
+                    self.subscriptions = SubscriptionIndex()
+        return self.subscriptions
+
+    def department_of(self, course_location):
+        """Return the (name, id) of the department a combination belongs to"""
+        if self.combination_departments is None:
+            # Names may contain underscores, so locations are matched whole
+            self.combination_departments = {
+                combination_name(college_name, degree_name, department_name):
+                    (department_name, department_id)
+                for college_name in self.config_dict['college_param1']
+                for degree_name in self.config_dict['degree_param0']
+                for department_name, department_id
+                in self.config_dict['academic_department_param2'].items()}
+        return self.combination_departments.get(course_location, ())
+
+    def notification_targets(self, course_location, change_type, course, section,
+                             lecturers=(), column=None, old=None, new=None):
+        """
+        Return the chats a change should be sent to: the default chats without
+        subscriptions when the change is enabled in notification_settings,
+        plus every chat whose subscription matches. (None,) stands for all
+        default chats when nobody has subscribed.
+        """
+        subscriptions = self.get_subscriptions()
+        enabled = self.notification_settings.get(column or change_type, True)
+        if not subscriptions:
+            return (None,) if enabled else ()
+        targets = {}
+        if enabled:
+            for chat_id in self.list_of_chat_ids:
+                if str(chat_id) not in subscriptions.chats:
+                    targets[str(chat_id)] = chat_id
+        for chat_id in subscriptions.match(self.department_of(course_location),
+                                           change_type, course, section, lecturers,
+                                           column, old, new):
+            targets.setdefault(chat_id, chat_id)
+        if targets:
+            self.metrics.inc('routed_notifications_total', len(targets),
+                             type=column or change_type)
+        return tuple(targets.values())
+
+    def row_targets(self, change_type, frame, course_location, column=None):
+        """
+        Return the notification targets of every row of a changeset part.
+        Without subscriptions every row goes to the same chats, so they are
+        only worked out once.
+        """
+        if not self.get_subscriptions():
+            return [self.notification_targets(course_location, change_type, '', '',
+                                              column=column)] * len(frame)
+        names, sections = frame['name'], frame['sectionNo']
+        lecturers = frame['lecturers'] if 'lecturers' in frame.columns else [None] * len(frame)
+        if column is not None:
+            return [self.notification_targets(
+                        course_location, change_type, name, section,
+                        (old, new) if column == 'lecturers' else (lecturer,), column, old, new)
+                    for name, section, lecturer, old, new
+                    in zip(names, sections, lecturers, frame['old'], frame['new'])]
+        return [self.notification_targets(course_location, change_type, name, section,
+                                          [lecturer])
+                for name, section, lecturer in zip(names, sections, lecturers)]
+
+    def queue_notifications(self, change_type, frame, course_location, column=None):
+        """
+        Render one part of a changeset and queue it for the chats each row is
+        routed to. Digest formats queue one message per group of rows going
+        to the same chats. Returns the number of rows routed anywhere.
+        """
+        if frame.empty:
+            return 0
+        targets = self.row_targets(change_type, frame, course_location, column)
+        routed = np.fromiter((bool(chats) for chats in targets), dtype=bool, count=len(targets))
+        if not routed.any():
+            return 0
+        if not routed.all():
+            frame = frame[routed]
+            targets = [chats for chats in targets if chats]
+        texts = self.renderer.render(change_type, frame, course_location, column)
+        if self.renderer.digest:
+            groups = {}
+            for position, chats in enumerate(targets):
+                groups.setdefault(chats, []).append(position)
+            for chats, positions in groups.items():
+                self.dispatcher.add(self.renderer.digest_message(
+                    change_type, texts[positions], course_location, column), chats)
+        else:
+            for text, chats in zip(texts, targets):
+                self.dispatcher.add(text, chats)
+        return len(texts)
+
+    async def check_cell_changes_through_column_name(self, changed_rows_df,
                                                      column_name_to_check,
                                                      message_footer):
         """
-        Check for changes in a specific column between two dataframes and return the rows with changes.
+        Send a message for every modified value of a specific column in a changeset.
         """
         try:
-            # Find rows where values in the specified column have changed
-            changed_rows_df = new_df[new_df[column_name_to_check].ne(
-                old_df[column_name_to_check])]
-
-            if changed_rows_df.shape[0] > 0:
-                for index in range(changed_rows_df.shape[0]):
-                    # Get the corresponding rows from both dataframes
-                    new_row = changed_rows_df.iloc[index]
-                    # Find the matching row in old_df using the course name
-                    old_row = old_df[old_df['name'] == new_row['name']].iloc[0]
-
-                    message_header = f"Changes Detected in {column_name_to_check.capitalize()}"
-
-                    # Only show the changed column and essential identifying information
-                    row_str = [
-                        f"Course Name: {new_row['name']}",
-                        f"Section: {new_row['sectionNo']}",
-                        f"Previous {column_name_to_check}: {old_row[column_name_to_check]}",  # Value from CSV
-                        f"New {column_name_to_check}: {new_row[column_name_to_check]}"       # Value from website
-                    ]
-
-                    if column_name_to_check == 'status':
-                        # Convert status codes to readable text
-                        status_map = {'1': 'Available', '2': 'Cancelled', '3': 'Closed'}
-                        row_str[-2] = f"Previous Status: {status_map.get(str(old_row[column_name_to_check]), old_row[column_name_to_check])}"
-                        row_str[-1] = f"New Status: {status_map.get(str(new_row[column_name_to_check]), new_row[column_name_to_check])}"
-
-                    each_row_message = '\n'.join(row_str)
-                    final_message = f"{message_header}\n\n{each_row_message}\n\n{message_footer}"
-
-                    print(f"Sending update for {new_row['name']} - {column_name_to_check} change")
-                    await self.send_telegram_message(final_message)
-
+            with self.metrics.time('stage_seconds', stage='render'):
+                routed = self.queue_notifications('modified', changed_rows_df,
+                                                  message_footer, column_name_to_check)
+            if routed:
+                print(f"Sending {routed} update(s) for {column_name_to_check} changes")
             return changed_rows_df
         except Exception as e:
             logging.error(
                 f"Error in check_cell_changes_through_column_name: {e}")
             return pd.DataFrame()
 
-    async def check_remove_courses(self, new_df, old_df, column_name,
-                                   message_footer):
+    async def check_remove_courses(self, missing_rows, message_footer):
         """
-        Check for courses that have been removed from the old dataframe compared to the new dataframe.
+        Send a message for every course section removed since the last snapshot.
         """
         try:
-            missing_rows = old_df[~old_df[column_name].isin(new_df[column_name]
-                                                            )]
-            missing_rows.reset_index(inplace=True)
-
-            if missing_rows.shape[0] > 0:
-                each_row_messages = []
-                for index in list(missing_rows.index):
-                    row_list = list(
-                        map(lambda x: str(x).strip(),
-                            missing_rows.iloc[index].tolist()))
-                    column_names = list(missing_rows.columns)
-
-                    message_header = 'Changes Occurs: COURSE(S) DELETED'
-                    row_str = []
-                    for column_name, value in zip(column_names, row_list):
-                        if column_name == 'status':
-                            if value == '1':
-                                value = 'Available'
-                            elif value == '2':
-                                value = 'Cancelled'
-                            elif value == '3':
-                                value = 'Closed'
-                        row_str.append(
-                            f'{column_name.title()} : {value.title()}')
-
-                    each_row_message = '\n'.join(row_str)
-                    final_message = message_header + '\n\n' + each_row_message + '\n\n' + message_footer
-                    await self.send_telegram_message(final_message
-                                                     )  # Await the coroutine
-                    logging.info(final_message)
+            with self.metrics.time('stage_seconds', stage='render'):
+                routed = self.queue_notifications('removed', missing_rows, message_footer)
+            if routed:
+                logging.info(f"Queued {routed} removed course(s) for {message_footer}")
         except Exception as e:
             logging.error(f"Error in check_remove_courses: {e}")
 
-    async def add_course(self, new_df, old_df, column_name, message_footer):
+    async def add_course(self, new_rows_added, message_footer):
         """
-        Check for new courses added to the new dataframe compared to the old dataframe.
+        Send a message for every course section added since the last snapshot.
         """
         try:
-            new_rows_added = new_df[~new_df[column_name].
-                                    isin(old_df[column_name])]
-            message_header = 'Changes Occurs: NEW COURSE(S) ADDED'
-
             if new_rows_added.shape[0] > 0:
-                each_row_messages = []
-                for index in range(new_rows_added.shape[0]):
-                    row_list = list(
-                        map(lambda x: str(x).strip(),
-                            new_rows_added.iloc[index].tolist()))
-                    column_names = list(new_rows_added.columns)
-
-                    row_str = []
-                    for column_name, value in zip(column_names, row_list):
-                        if column_name == 'status':
-                            if value == '1':
-                                value = 'Available'
-                            elif value == '2':
-                                value = 'Cancelled'
-                            elif value == '3':
-                                value = 'Closed'
-                        row_str.append(
-                            f'{column_name.title()} : {value.title()}')
-
-                    each_row_message = '\n'.join(row_str)
-                    final_message = message_header + '\n\n' + each_row_message + '\n\n' + message_footer
-                    await self.send_telegram_message(final_message
-                                                     )  # Await the coroutine
+                with self.metrics.time('stage_seconds', stage='render'):
+                    self.queue_notifications('added', new_rows_added, message_footer)
                 return True
             else:
                 return False
@@ -225,257 +2080,932 @@ class Telegram_Bot:
             logging.error(f"Error in add_course: {e}")
             return False
 
-    async def compare_new_and_downloaded_df(self, new_df, old_df, output_csv_name):
+    async def notify_changeset(self, output_csv_name, changeset):
         """
-        Compare a new dataframe with a downloaded dataframe and send messages for any changes detected.
+        Queue notifications for every change in a changeset.
         """
-        try:
-            def row_hash(row):
-                return hash(tuple(str(v) for v in row.values))
+        course_location = output_csv_name.split('.')[0]
+        print(f"Checking changes for {course_location}...")
 
-            new_df['row_hash'] = new_df.apply(row_hash, axis=1)
-            old_df['row_hash'] = old_df.apply(row_hash, axis=1)
+        await self.add_course(changeset['added'], course_location)
+        print(f"New courses check completed for {course_location}")
 
-            if new_df['row_hash'].equals(old_df['row_hash']):
-                print(f"No changes detected for {output_csv_name}")
-                return
+        await self.check_remove_courses(changeset['removed'], course_location)
+        print(f"Removed courses check completed for {course_location}")
 
-            course_location = output_csv_name.split('.')[0]
-            print(f"Checking changes for {course_location}...")
+        modified = changeset['modified']
+        subscribed = bool(self.get_subscriptions())
+        for column in priority_columns:
+            if not (subscribed or self.notification_settings.get(column, True)):
+                continue
+            changed_rows = modified[modified['column'] == column]
+            if changed_rows.empty:
+                continue
+            await self.check_cell_changes_through_column_name(
+                changed_rows, column, course_location)
+            print(f"Found and reported changes in {column} column")
+            self.stats['changes_detected'] += 1
+        for change_type, count in (('added', len(changeset['added'])),
+                                   ('removed', len(changeset['removed'])),
+                                   ('modified', len(modified))):
+            if count:
+                self.metrics.inc('combination_changes_total', count,
+                                 combination=course_location, type=change_type)
 
-            # First check for added/removed courses
-            course_added = await self.add_course(new_df, old_df, 'name', course_location)
-            print(f"New courses check completed for {course_location}")
+        print(f"All checks completed for {course_location}")
 
-            await self.check_remove_courses(new_df, old_df, 'name', course_location)
-            print(f"Removed courses check completed for {course_location}")
-
-            if not course_added:
-                priority_columns = ['status', 'times', 'days', 'rooms', 'lecturers', 'hours', 'remarks']
+    async def compare_new_and_downloaded_df(self, new_df, old_df, output_csv_name):
+        """
+        Compare a new dataframe with the previous snapshot and send messages for any changes detected.
+        In a worker process the changeset is handed to changeset_sink instead.
+        Returns the changeset built by diff_course_frames.
+        """
+        try:
+            with self.metrics.time('stage_seconds', stage='diff'):
+                changeset = diff_course_frames(new_df, old_df)
+            if changeset_is_empty(changeset):
+                print(f"No changes detected for {output_csv_name}")
+                return changeset
 
-                for column in priority_columns:
-                    if not self.notification_settings.get(column, True):
-                        continue
-                    print(f"Checking changes in {column} column...")
-
-                    # Compare values, treating empty and NaN as equivalent
-                    new_values = new_df[column].fillna('').astype(str).str.strip()
-                    old_values = old_df[column].fillna('').astype(str).str.strip()
-
-                    changed_mask = new_values != old_values
-
-                    if changed_mask.any():
-                        # Verify changes are real (not just different representations of empty)
-                        real_changes = []
-                        for idx in changed_mask[changed_mask].index:
-                            new_val = new_values[idx]
-                            old_val = old_values[idx]
-                            if not (pd.isna(new_val) and pd.isna(old_val)) and new_val != old_val:
-                                real_changes.append(idx)
-
-                        if real_changes:
-                            changed_df = new_df.loc[real_changes].copy()
-                            await self.check_cell_changes_through_column_name(
-                                changed_df, old_df, column, course_location)
-                            print(f"Found and reported real changes in {column} column")
-                            self.stats['changes_detected'] += 1
-                        else:
-                            print(f"No real changes found in {column} column")
-                    else:
-                        print(f"No changes found in {column} column")
-
-            print(f"All checks completed for {course_location}")
+            if self.changeset_sink is not None:
+                self.changeset_sink(output_csv_name, changeset)
+            else:
+                await self.notify_changeset(output_csv_name, changeset)
+            return changeset
 
         except Exception as e:
-            self.stats['errors_encountered'] += 1
-            logging.error(f"Error in compare_new_and_downloaded_df: {e}")
+            self.record_error('compare_new_and_downloaded_df', e)
+
+    async def renew_session(self, generation):
+        """
+        Get a fresh session cookie from the portal's index page. Callers pass
+        the session generation they saw, so concurrent renewals of the same
+        expired session only hit the portal once.
+        """
+        async with self.session_lock:
+            if self.session_generation != generation:
+                return
+            session_url = httpx.URL(self.portal_url).join(portal_session_path)
+            headers = {key: value for key, value in portal_headers.items()
+                       if key not in ('Content-Type', 'Origin')}
+            client = self._get_http_client()
+            client.cookies.clear()
+            try:
+                response = await client.get(session_url, headers=headers)
+            except httpx.HTTPError as e:
+                raise PortalError(f"Session renewal failed: {e!r}")
+            if response.status_code >= 400:
+                raise PortalError(f"Session renewal failed with HTTP {response.status_code}")
+            self.session_generation += 1
+            self.metrics.inc('session_renewals_total')
+            logging.info(f"Renewed portal session (generation {self.session_generation})")
 
-    async def params_to_dataframe(self, degree_id_param_0, college_id_param1,
-                            department_id_param2, page_num_param3):
+    async def _request_page(self, payload, cached):
         """
-        Fetch course data from the API and return it as a DataFrame.
+        Send one getCourses request and classify its response. Returns the
+        response (a 304 only when cached); raises PortalError, or
+        SessionExpiredError when the portal wants a new session.
         """
+        if self.session_generation == 0:
+            await self.renew_session(0)
+        generation = self.session_generation
         async with self.request_semaphore:
             await self._rate_limit()
+            self.circuit_breaker.before_request()
+            headers = portal_headers
+            if cached:
+                headers = dict(portal_headers)
+                if cached['etag']:
+                    headers['If-None-Match'] = cached['etag']
+                if cached['last_modified']:
+                    headers['If-Modified-Since'] = cached['last_modified']
+            limiter = self.rate_limiters['portal']
+            start = time.monotonic()
             try:
-                url = "http://appserver.fet.edu.jo:7778/courses/actions/rmiMethod"
-                payload = f"method=getCourses&paramsCount=4&param0={degree_id_param_0}&param1={college_id_param1}&param2={department_id_param2}&param3={page_num_param3}"
-                headers = {
-                    'Accept':
-                    '*/*',
-                    'Accept-Encoding':
-                    'gzip, deflate',
-                    'Accept-Language':
-                    'en-US,en;q=0.9',
-                    'Connection':
-                    'keep-alive',
-                    'Content-Length':
-                    '67',
-                    'Content-Type':
-                    'application/x-www-form-urlencoded',
-                    'Host':
-                    'appserver.fet.edu.jo:7778',
-                    'Origin':
-                    'http://appserver.fet.edu.jo:7778',
-                    'Referer':
-                    'http://appserver.fet.edu.jo:7778/courses/index.jsp',
-                    'User-Agent':
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36',
-                    'Cookie':
-                    'JSESSIONID=7f00000130d7c0410905455c41d48deaadd5e471fd4e.e34OaheNbxeRci0QahyTchuLci1ynknvrkLOlQzNp65In0'
-                }
-                response = requests.post(url, headers=headers, data=payload)
-                response.raise_for_status()
+                response = await self._get_http_client().post(
+                    self.portal_url, headers=headers, content=payload)
+            except httpx.HTTPError as e:
+                limiter.record(time.monotonic() - start, error=True)
+                self.circuit_breaker.record_failure()
+                raise PortalError(f"{type(e).__name__}: {e}") from e
+            except BaseException:
+                # Cancelled (a speculative page no longer needed, or shutdown):
+                # a half-open trial must not stay in flight forever
+                self.circuit_breaker.release_trial()
+                raise
+            latency = time.monotonic() - start
+            limiter.record(latency, response.status_code)
+            self.metrics.observe('stage_seconds', latency, stage='fetch_page')
+            self.metrics.inc('portal_responses_total', code=response.status_code)
+            if response.status_code in retry_settings['retry_statuses']:
+                self.circuit_breaker.record_failure()
+                raise PortalError(f"HTTP {response.status_code}")
+            self.circuit_breaker.record_success()
+
+        status = response.status_code
+        if status == 304 and cached:
+            return response
+        # An expired session is answered with the HTML login page instead of a payload
+        if status in (401, 403) or (status == 200 and (
+                'html' in response.headers.get('Content-Type', '')
+                or response.content.lstrip()[:1] == b'<')):
+            raise SessionExpiredError(f"Session generation {generation} expired",
+                                      generation)
+        if status >= 400:
+            raise PortalError(f"HTTP {status}", retryable=False)
+        return response
+
+    async def fetch_page(self, degree_id_param_0, college_id_param1,
+                         department_id_param2, page_num_param3, cache_key=None):
+        """
+        Fetch one page of course records.
+
+        When a cache_key is given the request is made conditional on the
+        ETag/Last-Modified of the previous response and the raw body is
+        hashed, so an unchanged page is returned from the cache without
+        being parsed again. Failed requests are retried with jittered
+        backoff and an expired session is renewed. Returns a dict with the
+        page's 'courses' (a CourseColumnBuffer), whether it 'changed', the
+        cache 'entry' to commit once the page is processed and whether it
+        ended in an 'error'. An empty page without an error is the end of
+        the data.
+        """
+        cached = self.page_cache.get(cache_key) if cache_key else None
+        payload = f"method=getCourses&paramsCount=4&param0={degree_id_param_0}&param1={college_id_param1}&param2={department_id_param2}&param3={page_num_param3}"
+        max_attempts = retry_settings['max_attempts']
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = await self._request_page(payload, cached)
+                if response.status_code == 304:
+                    return {'courses': cached['courses'], 'changed': False,
+                            'entry': None, 'error': False}
+
+                digest = hashlib.blake2b(response.content,
+                                         digest_size=16).digest()
+                if cached and cached['digest'] == digest:
+                    return {'courses': cached['courses'], 'changed': False,
+                            'entry': None, 'error': False}
+
                 response.encoding = 'utf-8'
-                json_dict = json.loads(
-                    response.text.replace('"', '').replace("'", '"').replace(
-                        '<br><br>', ' - '))
-                return pd.DataFrame(json_dict)
+                try:
+                    with self.metrics.time('stage_seconds', stage='parse'):
+                        courses = parse_courses_payload(response.text)
+                except ValueError as e:
+                    raise PortalError(f"Unparseable getCourses payload: {e}")
+                entry = {
+                    'digest': digest,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'courses': courses,
+                }
+                return {'courses': courses, 'changed': True, 'entry': entry,
+                        'error': False}
             except Exception as e:
-                self.stats['errors_encountered'] += 1
-                logging.error(f"Error in params_to_dataframe: {e}")
-                return pd.DataFrame()
+                retryable = getattr(e, 'retryable', False)
+                if isinstance(e, SessionExpiredError):
+                    try:
+                        await self.renew_session(e.generation)
+                    except PortalError as renew_error:
+                        e = renew_error
+                if not retryable or attempt == max_attempts:
+                    self.record_error('fetch_page', e)
+                    return {'courses': CourseColumnBuffer(), 'changed': True,
+                            'entry': None, 'error': True}
+                if not isinstance(e, SessionExpiredError):
+                    delay = random.uniform(0, min(
+                        retry_settings['backoff_max'],
+                        retry_settings['backoff_base'] * 2 ** (attempt - 1)))
+                    logging.warning(f"Retrying page {page_num_param3} of "
+                                    f"{degree_id_param_0}_{college_id_param1}_{department_id_param2} "
+                                    f"in {delay:.2f}s after attempt {attempt}: {e}")
+                    await asyncio.sleep(delay)
+                self.metrics.inc('fetch_retries_total', reason=type(e).__name__)
+
+    async def fetch_course_pages(self, college_id_param1, degree_id_param_0,
+                                 department_id_param2, output_csv_name=None):
+        """
+        Fetch every page of one combination, keeping a window of pages in flight.
+        Requests speculatively issued past the last page are cancelled once it is found.
+        The returned list ends with the first empty page (the end of the data) or
+        with the first page that failed, whose 'error' is set.
+        """
+        window = max(1, fetch_settings['prefetch_pages'])
+        max_pages = fetch_settings['max_pages']
+        pending = {}
+        next_page = 1
+        pages = []
+        try:
+            for page_num in range(1, max_pages + 1):
+                while next_page <= max_pages and next_page < page_num + window:
+                    cache_key = (output_csv_name, next_page) if output_csv_name else None
+                    pending[next_page] = asyncio.ensure_future(
+                        self.fetch_page(degree_id_param_0, college_id_param1,
+                                        department_id_param2, str(next_page),
+                                        cache_key=cache_key))
+                    next_page += 1
+                page = await pending.pop(page_num)
+                page['page'] = page_num
+                pages.append(page)
+                if page['error'] or not page['courses'].rows:
+                    break
+        finally:
+            for task in pending.values():
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending.values(), return_exceptions=True)
+        return pages
+
+    @staticmethod
+    def normalize_courses_df(df):
+        """
+        Standardize empty values and strip strings so website data and stored snapshots compare equal.
+        """
+        df = df.replace({pd.NA: '', pd.NaT: '', None: '', 'nan': '', float('nan'): ''})
+        df = df.fillna('')
+        for col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+        if 'remarks' in df.columns:
+            df['remarks'] = df['remarks'].str.replace('-', '')
+        df.reset_index(drop=True, inplace=True)
+        return df
+
+    def get_store(self):
+        """Open the course store on first use"""
+        if self.store is None:
+            self.store = CourseStore(persist_settings['database_path'])
+        return self.store
+
+    def get_snapshot(self, output_csv_name):
+        """
+        Return the in-memory baseline for a combination.
+        Each baseline is loaded from the store the first time its combination
+        is swept; a combination missing from the store is imported from its
+        legacy CSV.
+        """
+        if output_csv_name not in self.snapshots:
+            snapshot = self.get_store().load_snapshot(output_csv_name)
+            if snapshot is not None:
+                self.snapshots[output_csv_name] = apply_course_schema(
+                    self.normalize_courses_df(snapshot))
+                return self.snapshots[output_csv_name]
+            snapshot = None
+            csv_path = os.path.join(persist_settings['csv_dir'], output_csv_name)
+            if os.path.exists(csv_path):
+                try:
+                    snapshot = apply_course_schema(self.normalize_courses_df(
+                        pd.read_csv(csv_path, dtype=str, keep_default_na=False)))
+                    self.schedule_store_write(self.get_store().replace_snapshot,
+                                              output_csv_name, snapshot)
+                except Exception as e:
+                    logging.error(f"Error reading existing CSV file {output_csv_name}: {e}")
+            self.snapshots[output_csv_name] = snapshot
+        return self.snapshots[output_csv_name]
+
+    def schedule_store_write(self, write, *args):
+        """
+        Queue a store write to run after the debounce delay.
+        Writes queued within the delay are applied together, in order.
+        """
+        self.pending_writes.append((write, args + (time.time(),)))
+        if self.write_task is None or self.write_task.done():
+            self.write_task = asyncio.ensure_future(self._debounced_flush())
+
+    async def _debounced_flush(self):
+        await asyncio.sleep(persist_settings['write_debounce_seconds'])
+        await self.flush_store_writes()
+
+    async def flush_store_writes(self):
+        """Apply every pending store write on the store's writer thread"""
+        if not self.pending_writes:
+            return
+        writes, self.pending_writes = self.pending_writes, []
+        store = self.get_store()
+
+        def apply_writes():
+            for write, args in writes:
+                write(*args)
+
+        try:
+            with self.metrics.time('stage_seconds', stage='persist'):
+                await asyncio.get_running_loop().run_in_executor(store.executor,
+                                                                 apply_writes)
+        except Exception as e:
+            self.record_error('flush_store_writes', e)
 
     async def download_csv_using_params(self, college_id_param1,
                                         degree_id_param_0,
                                         department_id_param2, output_csv_name):
         """
-        Download current website data and compare it with the existing CSV file for any changes.
+        Download current website data and compare it with the last snapshot for any changes.
+        Returns 'changed', 'unchanged' or 'error' for the scheduler.
         """
         try:
-            if not os.path.exists('./Data_CSVs'):
-                os.mkdir('./Data_CSVs')
-
             # First fetch current website data
-            df_list = []
-            for page_num in range(1, 100):
-                df = await self.params_to_dataframe(degree_id_param_0,
-                                              college_id_param1,
-                                              department_id_param2,
-                                              str(page_num))
-                if not df.empty:
-                    df_list.append(df)
+            pages = await self.fetch_course_pages(college_id_param1,
+                                                  degree_id_param_0,
+                                                  department_id_param2,
+                                                  output_csv_name)
+
+            # Fast path: every page hashed the same as last time, so there is
+            # nothing to parse, compare or write
+            if pages and not any(page['changed'] for page in pages):
+                print(f"No changes detected for {output_csv_name}")
+                return 'unchanged'
+
+            # A combination is only diffed and committed when every page was
+            # fetched; a partial catalog would read as removed sections
+            if pages and pages[-1]['error']:
+                logging.warning(
+                    f"Page {pages[-1]['page']} of {output_csv_name} failed, keeping the last snapshot",
+                    extra={'event': 'partial_sweep', 'combination': output_csv_name.split('.')[0],
+                           'failed_page': pages[-1]['page']})
+                return 'error'
+            if pages and pages[-1]['courses'].rows:
+                logging.warning(f"{output_csv_name} still had data at page "
+                                f"{fetch_settings['max_pages']} (max_pages)")
+            outcome = 'unchanged'
+
+            existing_df = self.get_snapshot(output_csv_name)
+            plan = self.plan_page_diff(output_csv_name, pages, existing_df)
+            if plan is not None:
+                # Only the changed pages are diffed, against the rows they held before
+                old_df = existing_df.iloc[plan['old_positions']].reset_index(drop=True)
+                new_df = plan['new_df']
+                self.metrics.inc('page_diffs_total', mode='incremental')
+            else:
+                old_df = existing_df
+                with self.metrics.time('stage_seconds', stage='normalize'):
+                    new_df = self.page_frame(pages)
+                self.metrics.inc('page_diffs_total', mode='full')
+                if not len(new_df):
+                    logging.warning(f"No data available for {output_csv_name.split('.')[0]}")
+                    return outcome
+
+            if old_df is None:
+                self.schedule_store_write(self.get_store().replace_snapshot,
+                                          output_csv_name, new_df)
+                snapshot = new_df
+            else:
+                changeset = await self.compare_new_and_downloaded_df(
+                    new_df, old_df, output_csv_name)
+                if changeset is None:
+                    # Keep the old baseline so the changes are found again next sweep
+                    return 'error'
+                if not changeset_is_empty(changeset):
+                    print(f"Real changes detected in {output_csv_name}")
+                    outcome = 'changed'
+                if plan is not None:
+                    # Place the changed rows at their catalog positions among the untouched ones
+                    snapshot = splice_course_frames(existing_df, new_df, plan['take'])
+                    new_df.index = plan['new_positions']
                 else:
+                    snapshot = new_df
+                if outcome == 'changed':
+                    shifts = position_shifts(*self.position_moves(
+                        existing_df, old_df, new_df, plan))
+                    self.schedule_store_write(self.get_store().apply_changeset,
+                                              output_csv_name, new_df, changeset, shifts)
+
+            # Keep the new snapshot as the baseline
+            self.snapshots[output_csv_name] = snapshot
+            if plan is not None:
+                key_counts = self.snapshot_key_counts[output_csv_name]
+                key_counts.subtract(plan['old_key_counts'])
+                key_counts.update(plan['new_key_counts'])
+                for key in plan['old_key_counts']:
+                    if key_counts[key] <= 0:
+                        del key_counts[key]
+            else:
+                self.snapshot_key_counts[output_csv_name] = course_key_counts(snapshot)
+            self.page_layouts[output_csv_name] = [page['courses'].rows for page in pages]
+
+            # Remember the page digests only once the sweep has been processed
+            for page in pages:
+                if page['entry'] is not None:
+                    self.page_cache[(output_csv_name, page['page'])] = page['entry']
+            for page_num in range(len(pages) + 1, fetch_settings['max_pages'] + 1):
+                if self.page_cache.pop((output_csv_name, page_num), None) is None:
                     break
+            return outcome
+        except Exception as e:
+            self.record_error('download_csv_using_params', e)
+            return 'error'
 
-            if df_list:
-                current_website_df = pd.concat(df_list)
-                current_website_df.reset_index(drop=True, inplace=True)
+    def page_frame(self, pages, like_df=None):
+        """Normalize the records of some pages into one schema frame, shaped like like_df when they hold no rows"""
+        courses = CourseColumnBuffer()
+        for page in pages:
+            courses.extend(page['courses'])
+        if not courses.rows:
+            return like_df.iloc[:0] if like_df is not None else pd.DataFrame()
+        return apply_course_schema(self.normalize_courses_df(courses.to_frame()))
 
-                # Standardize empty values in current website DataFrame
-                current_website_df = current_website_df.replace({pd.NA: '', pd.NaT: '', None: '', 'nan': '', float('nan'): ''})
-                current_website_df = current_website_df.fillna('')
+    @staticmethod
+    def position_moves(existing_df, old_df, new_df, plan=None):
+        """
+        Return the old and new catalog positions of every baseline row kept
+        in the new snapshot, for position_shifts(). Rows on the pages a plan
+        left untouched move with their page; rows of the diffed frames are
+        matched by course key.
+        """
+        indexer = course_index(new_df).get_indexer(course_index(old_df))
+        kept = indexer >= 0
+        if plan is None:
+            return np.flatnonzero(kept), indexer[kept]
+        take = plan['take']
+        untouched = np.flatnonzero(take < len(existing_df))
+        return (np.concatenate([take[untouched], plan['old_positions'][kept]]),
+                np.concatenate([untouched,
+                                plan['new_positions'].to_numpy()[indexer[kept]]]))
 
-                # Clean and standardize strings
-                for col in current_website_df.columns:
-                    if current_website_df[col].dtype == object:
-                        current_website_df[col] = current_website_df[col].astype(str).str.strip()
+    def plan_page_diff(self, output_csv_name, pages, existing_df):
+        """
+        Work out which rows of the baseline belong to the pages whose
+        fingerprints changed, so only those pages are diffed.
 
-                # Read existing CSV if it exists
-                existing_csv_df = None
-                if os.path.exists(f'./Data_CSVs/{output_csv_name}'):
-                    try:
-                        existing_csv_df = pd.read_csv(f'./Data_CSVs/{output_csv_name}')
+        Rows that moved across a page boundary change the content of both
+        pages, so they are matched by key within the changed pages. Returns
+        the normalized 'new_df' of the changed pages, the 'old_positions' of
+        their baseline rows and the 'take' positions that splice them into
+        the new baseline. Returns None, meaning the whole catalog has to be
+        diffed, when there is no page layout for the baseline, when the
+        changed pages hold too much of the catalog, when the fields changed
+        or when a course key of the changed pages also appears on an
+        unchanged page (its occurrence number would be ambiguous).
+        """
+        layout = self.page_layouts.get(output_csv_name)
+        key_counts = self.snapshot_key_counts.get(output_csv_name)
+        if existing_df is None or layout is None or key_counts is None \
+                or sum(layout) != len(existing_df):
+            return None
 
-                        # Apply same standardization to existing CSV DataFrame
-                        existing_csv_df = existing_csv_df.replace({pd.NA: '', pd.NaT: '', None: '', 'nan': '', float('nan'): ''})
-                        existing_csv_df = existing_csv_df.fillna('')
+        starts = np.concatenate([[0], np.cumsum(layout)]).astype(np.int64)
+        changed = [index for index, page in enumerate(pages)
+                   if page['changed'] or index >= len(layout)
+                   or page['courses'].rows != layout[index]]
+        # Pages past the new last page lost all their rows
+        old_pages = [index for index in changed if index < len(layout)]
+        old_pages += list(range(len(pages), len(layout)))
+        old_positions = np.concatenate(
+            [np.arange(starts[index], starts[index + 1]) for index in old_pages]
+            or [np.empty(0, dtype=np.int64)]).astype(np.int64)
+        changed_pages = [pages[index] for index in changed]
+        new_rows = sum(page['courses'].rows for page in changed_pages)
+        if max(len(old_positions), new_rows) > (
+                fetch_settings['incremental_diff_max_fraction'] * max(len(existing_df), 1)):
+            return None
 
-                        # Clean and standardize strings
-                        for col in existing_csv_df.columns:
-                            if existing_csv_df[col].dtype == object:
-                                existing_csv_df[col] = existing_csv_df[col].astype(str).str.strip()
+        old_key_counts = course_key_counts(existing_df.iloc[old_positions])
+        for key, count in old_key_counts.items():
+            if key_counts.get(key, 0) != count:
+                return None
+        with self.metrics.time('stage_seconds', stage='normalize'):
+            new_df = self.page_frame(changed_pages, existing_df)
+        if list(new_df.columns) != list(existing_df.columns):
+            return None
+        new_key_counts = course_key_counts(new_df)
+        for key in new_key_counts:
+            if key_counts.get(key, 0) != old_key_counts.get(key, 0):
+                return None
 
-                        existing_csv_df.reset_index(drop=True, inplace=True)
-                    except Exception as e:
-                        logging.error(f"Error reading existing CSV file {output_csv_name}: {e}")
-                        existing_csv_df = None
-
-                if existing_csv_df is not None:
-                    # Compare current website data with existing CSV
-                    if not current_website_df.equals(existing_csv_df):
-                        real_changes = False
-                        for col in current_website_df.columns:
-                            if not (current_website_df[col].fillna('') == existing_csv_df[col].fillna('')).all():
-                                real_changes = True
-                                break
-
-                        if real_changes:
-                            print(f"Real changes detected in {output_csv_name}")
-                            await self.compare_new_and_downloaded_df(current_website_df, existing_csv_df, output_csv_name)
-                        else:
-                            print(f"No real changes detected in {output_csv_name}")
-
-                # Save the current website data to CSV
-                if not current_website_df.empty:
-                    current_website_df['remarks'] = current_website_df['remarks'].str.replace('-', '')
-                    current_website_df.to_csv(f'./Data_CSVs/{output_csv_name}',
-                                  index=False,
-                                  encoding='utf-8-sig')
+        # Positions of the new catalog in [baseline rows, changed rows]
+        take = []
+        new_positions = []
+        next_new = len(existing_df)
+        changed = set(changed)
+        for index, page in enumerate(pages):
+            if index in changed:
+                rows = page['courses'].rows
+                new_positions.extend(range(len(take), len(take) + rows))
+                take.extend(range(next_new, next_new + rows))
+                next_new += rows
             else:
-                logging.warning(f"No data available for {output_csv_name.split('.')[0]}")
-        except Exception as e:
-            logging.error(f"Error in download_csv_using_params: {e}")
+                take.extend(range(starts[index], starts[index + 1]))
+        return {
+            'new_df': new_df,
+            'old_positions': old_positions,
+            'old_key_counts': old_key_counts,
+            'new_key_counts': new_key_counts,
+            'take': np.asarray(take, dtype=np.int64),
+            'new_positions': pd.Index(new_positions),
+        }
+
+    def get_combinations(self):
+        """
+        Return (college_id, degree_id, department_id, output_csv_name) for every
+        combination of parameters in the config_dict that should be monitored.
+        """
+        combinations = []
+        for college_name, college_id in self.config_dict[
+                'college_param1'].items():
+            for degree_name, degree_id in self.config_dict[
+                    'degree_param0'].items():
+                for department_name, department_id in self.config_dict[
+                        'academic_department_param2'].items():
+                    if college_id == '3':
+                        if department_id != '1' and department_id != '7':
+                            continue
+                    elif college_id != '2':
+                        continue
+                    output_csv_name = f"{combination_name(college_name, degree_name, department_name)}.csv"
+                    combinations.append((college_id, degree_id, department_id,
+                                         output_csv_name))
+        return combinations
+
+    async def _timed_download(self, college_id, degree_id, department_id,
+                              output_csv_name):
+        """Run one combination under the concurrency budget, record its wall-clock time and return its outcome"""
+        async with self.combination_semaphore:
+            start = time.perf_counter()
+            outcome = await self.download_csv_using_params(college_id, degree_id,
+                                                           department_id, output_csv_name)
+            elapsed = time.perf_counter() - start
+        self.sweep_timings[output_csv_name] = elapsed
+        combination = output_csv_name.split('.')[0]
+        self.metrics.inc('combination_sweeps_total', combination=combination)
+        self.metrics.observe('combination_sweep_seconds', elapsed, combination=combination)
+        print(f"Sweep of {combination} took {elapsed:.2f}s")
+        logging.info(f"Sweep time for {output_csv_name}: {elapsed:.3f}s",
+                     extra={'event': 'combination_swept', 'combination': combination,
+                            'seconds': round(elapsed, 6), 'outcome': outcome})
+        return outcome
+
+    async def sweep(self, combinations):
+        """
+        Check every given combination concurrently, then hand the collected notifications to the dispatcher.
+        Returns the outcome of every combination.
+        """
+        sweep_start = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            self._timed_download(*combination)
+            for combination in combinations))
+        await self.dispatcher.flush()
+        elapsed = time.perf_counter() - sweep_start
+        self.metrics.observe('sweep_seconds', elapsed)
+        self.metrics.set('notification_queue_depth', self.dispatcher.qsize())
+        logging.info(
+            f"Sweep of {len(combinations)} combination(s) took {elapsed:.2f}s",
+            extra={'event': 'sweep', 'combinations': len(combinations),
+                   'seconds': round(elapsed, 6),
+                   'notification_queue_depth': self.dispatcher.qsize()})
+        return outcomes
+
+    async def poll(self, combinations, scheduler=None, should_stop=None,
+                   after_round=None):
+        """
+        Poll combinations as the adaptive scheduler makes them due, until
+        should_stop() returns True. Every due combination runs as its own
+        task (within max_concurrent_combinations) and is rescheduled as soon
+        as it finishes, so a slow combination never holds back the others.
+        after_round is awaited whenever one or more combinations finished.
+        """
+        self.scheduler = scheduler or PollScheduler(combinations)
+        should_stop = should_stop or (lambda: False)
+        running = {}
+        try:
+            while not should_stop():
+                now = time.time()
+                for combination in self.scheduler.pop_due(now):
+                    running[asyncio.ensure_future(
+                        self._timed_download(*combination))] = combination
+                # Wake up in small steps so should_stop and new due times are noticed quickly
+                next_due = self.scheduler.next_due()
+                timeout = (min(max(next_due - now, 0.05), 0.5)
+                           if next_due is not None else 0.5)
+                if not running:
+                    await asyncio.sleep(timeout)
+                    continue
+                done, _ = await asyncio.wait(running, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if done:
+                    await self._finish_polls(done, running, after_round)
+            # Let the polls in flight finish before returning
+            if running:
+                done, _ = await asyncio.wait(running)
+                await self._finish_polls(done, running, after_round)
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _finish_polls(self, done, running, after_round):
+        """Reschedule finished poll tasks and hand their notifications to the dispatcher"""
+        for task in done:
+            combination = running.pop(task)
+            try:
+                outcome = task.result()
+            except Exception as e:
+                self.record_error('poll', e)
+                outcome = 'error'
+            self.scheduler.record(combination, outcome)
+        await self.dispatcher.flush()
+        self.metrics.set('notification_queue_depth', self.dispatcher.qsize())
+        self.stats['iterations_completed'] += 1
+        self.update_schedule_metrics()
+        if after_round is not None:
+            await after_round()
+
+    def update_schedule_metrics(self):
+        """Publish the interval and effective poll rate of every scheduled combination"""
+        if self.scheduler is None:
+            return
+        for name, rate in self.scheduler.rates().items():
+            combination = name.split('.')[0]
+            self.metrics.set('poll_interval_seconds', rate['interval'],
+                             combination=combination)
+            if rate['polls_per_minute'] is not None:
+                self.metrics.set('poll_rate_per_minute', rate['polls_per_minute'],
+                                 combination=combination)
 
     async def get_dataframe_on_parameters(self):
         """
         Get the dataframe for each combination of parameters specified in the config_dict.
         """
         try:
-            for college_name, college_id in self.config_dict[
-                    'college_param1'].items():
-                for degree_name, degree_id in self.config_dict[
-                        'degree_param0'].items():
-                    for department_name, department_id in self.config_dict[
-                            'academic_department_param2'].items():
-                        if college_id == '3':
-                            if department_id == '1' or department_id == '7':
-                                output_csv_name = f"Course_Data - {college_name}_{degree_name}_{department_name}.csv"
-                                await self.download_csv_using_params(
-                                    college_id, degree_id, department_id,
-                                    output_csv_name)  # Await the coroutine
-                        elif college_id == '2':
-                            output_csv_name = f"Course_Data - {college_name}_{degree_name}_{department_name}.csv"
-                            await self.download_csv_using_params(
-                                college_id, degree_id, department_id,
-                                output_csv_name)  # Await the coroutine
+            await self.sweep(self.get_combinations())
         except Exception as e:
             logging.error(f"Error in get_dataframe_on_parameters: {e}")
 
+    def take_stats(self):
+        """Return the counters accumulated since the last call and reset them"""
+        delta = {key: value for key, value in self.stats.items()
+                 if key != 'start_time'}
+        for key in delta:
+            self.stats[key] = 0
+        return delta
+
+
+def resident_memory_mb():
+    """Return the resident set size of this process in MB (the peak where the current one is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def measure_startup(target_seconds=None):
+    """
+    Report how long the entry point takes to get a bot ready and how much
+    memory it holds, then what the deferred imports add once the first sweep
+    needs them. Returns True when the cold start is within target_seconds.
+    """
+    target_seconds = target_seconds or startup_settings['target_seconds']
+    start = time.perf_counter()
+    bot = Telegram_Bot(bot_token, list_of_chat_ids, config_dict)
+    construct_seconds = time.perf_counter() - start
+    ready_rss = resident_memory_mb()
+
+    start = time.perf_counter()
+    for name in ('numpy', 'pandas', 'httpx', 'telegram'):
+        importlib.import_module(name)
+    bot.bot
+    deferred_seconds = time.perf_counter() - start
+
+    cold_start = _import_seconds + construct_seconds
+    print(f"Module import:      {_import_seconds * 1000:8.1f} ms")
+    print(f"Bot construction:   {construct_seconds * 1000:8.1f} ms")
+    print(f"Cold start:         {cold_start * 1000:8.1f} ms (target {target_seconds * 1000:.0f} ms)")
+    print(f"RSS when ready:     {ready_rss:8.1f} MB")
+    print(f"Deferred imports:   {deferred_seconds * 1000:8.1f} ms on first sweep")
+    print(f"RSS after them:     {resident_memory_mb():8.1f} MB")
+    logging.info(f"Cold start took {cold_start:.3f}s",
+                 extra={'event': 'startup', 'import_seconds': round(_import_seconds, 6),
+                        'construct_seconds': round(construct_seconds, 6),
+                        'deferred_import_seconds': round(deferred_seconds, 6),
+                        'rss_mb': round(ready_rss, 1)})
+    return cold_start <= target_seconds
+
+
+def pack_changeset(changeset):
+    """Turn a changeset into plain lists so it can be sent to another process cheaply"""
+    return {part: {'columns': list(frame.columns),
+                   'data': frame.astype(object).to_numpy().tolist()}
+            for part, frame in changeset.items()}
+
+
+def unpack_changeset(packed):
+    """Rebuild the changeset frames from pack_changeset output"""
+    return {part: pd.DataFrame(frame['data'], columns=frame['columns'])
+            for part, frame in packed.items()}
+
+
+def worker_rate_limit_settings(settings, workers):
+    """Split a rate limit between workers so that together they stay within it"""
+    share = dict(settings)
+    for key in ('rate', 'min_rate', 'max_rate', 'increase_step'):
+        share[key] = settings[key] / workers
+    share['burst'] = max(1, settings['burst'] / workers)
+    return share
+
+
+def run_worker(worker_id, shard, result_queue, stop_event, bot_token,
+               list_of_chat_ids, config_dict, portal_url=portal_url,
+               workers=1, circuit_open_until=None):
+    """
+    Entry point of a polling worker process. Polls its shard of
+    combinations on its own scheduler and event loop and sends changesets
+    and stats deltas to the notifier process through result_queue.
+    The portal rate limit is split evenly between the workers, and
+    circuit_open_until shares the portal circuit breaker's open state.
+    """
+    # Ctrl+C is handled by the notifier, which stops workers through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    async def worker_loop():
+        bot = Telegram_Bot(bot_token, list_of_chat_ids, config_dict,
+                           portal_url=portal_url)
+        bot.rate_limiters['portal'] = TokenBucket(
+            'portal', **worker_rate_limit_settings(rate_limit_settings['portal'], workers))
+        bot.request_semaphore = asyncio.Semaphore(
+            max(1, http_settings['max_concurrent_requests'] // workers))
+        bot.circuit_breaker.shared_open_until = circuit_open_until
+        bot.changeset_sink = lambda output_csv_name, changeset: result_queue.put(
+            ('changeset', worker_id, output_csv_name, pack_changeset(changeset)))
+        async def after_round():
+            await bot.flush_store_writes()
+            result_queue.put(('stats', worker_id, bot.take_stats(),
+                              bot.metrics.drain()))
+
+        try:
+            await bot.poll(shard, should_stop=stop_event.is_set,
+                           after_round=after_round)
+        finally:
+            await bot.close()
+
+    configure_json_logging()
+    logging.info(f"Worker {worker_id} started with {len(shard)} combination(s)")
+    asyncio.run(worker_loop())
+    logging.info(f"Worker {worker_id} stopped")
+
+
+class ShardSupervisor:
+    """
+    Shards the combinations of a bot across worker processes and acts as
+    the single notifier: changesets from the workers are rendered and sent
+    through the bot's dispatcher, and their stats are merged into bot.stats.
+    Workers that die are restarted after worker_settings['restart_delay'].
+    """
+
+    def __init__(self, bot, processes):
+        self.bot = bot
+        self.context = multiprocessing.get_context('spawn')
+        combinations = bot.get_combinations()
+        # Every worker needs at least one in-flight request and one token of
+        # burst, so more workers than that would exceed the bot-wide limits
+        limit = max(1, min(http_settings['max_concurrent_requests'],
+                           int(rate_limit_settings['portal']['burst'])))
+        if processes > limit:
+            logging.warning(f"Capping {processes} workers at {limit}, the portal's "
+                            f"max_concurrent_requests/burst")
+            print(f"Using {limit} workers: the portal limits allow no more")
+        processes = max(1, min(processes, len(combinations), limit))
+        self.shards = [combinations[index::processes] for index in range(processes)]
+        self.result_queue = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.circuit_open_until = self.context.Value('d', 0.0)
+        self.workers = {}
+        self.died_at = {}
+
+    def _start_worker(self, worker_id):
+        process = self.context.Process(
+            target=run_worker, name=f"poller-{worker_id}", daemon=True,
+            args=(worker_id, self.shards[worker_id], self.result_queue,
+                  self.stop_event, self.bot.bot_token, self.bot.list_of_chat_ids,
+                  self.bot.config_dict, self.bot.portal_url,
+                  len(self.shards), self.circuit_open_until))
+        process.start()
+        self.workers[worker_id] = process
+        self.died_at.pop(worker_id, None)
+
+    def start(self):
+        for worker_id in range(len(self.shards)):
+            self._start_worker(worker_id)
+        print(f"Started {len(self.shards)} polling worker(s)")
+
+    def _check_workers(self):
+        """Restart workers that exited while the supervisor is running"""
+        now = time.monotonic()
+        for worker_id, process in self.workers.items():
+            if process.is_alive() or self.stop_event.is_set():
+                continue
+            if worker_id not in self.died_at:
+                self.died_at[worker_id] = now
+                self.bot.stats['errors_encountered'] += 1
+                self.bot.metrics.inc('worker_exits_total', worker=worker_id)
+                logging.error(f"Worker {worker_id} exited with code {process.exitcode}",
+                              extra={'event': 'worker_exit', 'worker': worker_id,
+                                     'exitcode': process.exitcode})
+            elif now - self.died_at[worker_id] >= worker_settings['restart_delay']:
+                logging.info(f"Restarting worker {worker_id}")
+                self._start_worker(worker_id)
+
+    async def _handle(self, message):
+        kind, worker_id = message[:2]
+        if kind == 'changeset':
+            output_csv_name, packed = message[2:]
+            await self.bot.notify_changeset(output_csv_name, unpack_changeset(packed))
+        elif kind == 'stats':
+            for key, value in message[2].items():
+                self.bot.stats[key] += value
+            self.bot.metrics.merge(message[3])
+            await self.bot.dispatcher.flush()
+
+    async def run(self, health_report_interval=3600):
+        loop = asyncio.get_running_loop()
+        last_health_report = time.time()
+        while True:
+            try:
+                message = await loop.run_in_executor(None, self.result_queue.get,
+                                                     True, 0.5)
+                await self._handle(message)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                self.bot.record_error('worker message', e)
+            self._check_workers()
+            if time.time() - last_health_report > health_report_interval:
+                await self.bot.send_health_report()
+                last_health_report = time.time()
+
+    def stop(self):
+        """Ask every worker to finish its sweep and exit, terminating any that do not"""
+        self.stop_event.set()
+        deadline = time.monotonic() + worker_settings['shutdown_timeout']
+        for worker_id, process in self.workers.items():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.warning(f"Terminating worker {worker_id}")
+                process.terminate()
+                process.join()
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="BAU course monitor bot")
+    parser.add_argument('--workers', type=int,
+                        default=worker_settings['processes'],
+                        help="shard combinations across this many polling processes (0 = single process)")
+    parser.add_argument('--metrics-port', type=int, default=metrics_settings['port'],
+                        help="port of the /metrics endpoint (0 = disabled)")
+    parser.add_argument('--message-format', choices=sorted(message_templates),
+                        default=render_settings['format'],
+                        help="notification template set")
+    parser.add_argument('--language', choices=sorted(message_labels),
+                        default=render_settings['language'],
+                        help="language of notification labels")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="report import time and memory of a cold start, then exit "
+                             "(non-zero when over startup_settings['target_seconds'])")
+    args = parser.parse_args()
+    configure_json_logging()
+
+    if args.measure_startup:
+        raise SystemExit(0 if measure_startup() else 1)
+
     try:
         print("Starting BAU Course Monitor Bot...")
         logging.info("Bot initialized and starting monitoring process")
         class_obj = Telegram_Bot(bot_token, list_of_chat_ids, config_dict)
+        class_obj.renderer = MessageRenderer(args.message_format, args.language)
 
         async def main():
             health_report_interval = 3600  # 1 hour
-            last_health_report = time.time()
-            iteration = 1
-
-            while True:
-                try:
-                    print(f"\nStarting iteration {iteration}")
-                    print(f"Checking for updates at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-                    await class_obj.get_dataframe_on_parameters()
 
-                    if time.time() - last_health_report > health_report_interval:
+            async def health_reports():
+                while True:
+                    await asyncio.sleep(health_report_interval)
+                    try:
                         await class_obj.send_health_report()
-                        last_health_report = time.time()
+                    except Exception as e:
+                        class_obj.record_error('send_health_report', e)
 
-                    class_obj.stats['iterations_completed'] += 1
-                    print(f"Iteration {iteration} completed. Waiting {run_script_after_every_seconds} seconds...")
-                    logging.info(f"Completed iteration {iteration}")
-                    iteration += 1
-                    await asyncio.sleep(run_script_after_every_seconds)
+            reporter = asyncio.ensure_future(health_reports())
+            try:
+                print(f"Polling {len(class_obj.get_combinations())} combination(s) "
+                      f"from {time.strftime('%Y-%m-%d %H:%M:%S')}")
+                await class_obj.poll(class_obj.get_combinations())
+            finally:
+                reporter.cancel()
 
-                except Exception as e:
-                    class_obj.stats['errors_encountered'] += 1
-                    logging.error(f"Iteration error: {e}")
-                    await asyncio.sleep(30)  # Brief pause before retry
+        async def run():
+            supervisor = None
+            try:
+                await class_obj.start_metrics_server(port=args.metrics_port)
+                if args.workers > 0:
+                    supervisor = ShardSupervisor(class_obj, args.workers)
+                    supervisor.start()
+                    await supervisor.run()
+                else:
+                    await main()
+            finally:
+                if supervisor is not None:
+                    supervisor.stop()
+                await class_obj.close()
 
-        asyncio.run(main())
+        asyncio.run(run())
     except Exception as e:
         logging.error(f"Script failed: {e}")
         print(f"Script encountered an error: {e}")
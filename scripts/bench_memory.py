@@ -0,0 +1,68 @@
+"""
+Memory per course snapshot with plain object strings versus the compact
+course schema (categoricals and an int8 status code), plus the time to
+diff two snapshots in each representation.
+
+    python scripts/bench_memory.py --sections 1000 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from fixtures import make_catalog
+
+
+def build_snapshots(num_sections):
+    courses = main.CourseColumnBuffer()
+    for record in make_catalog(num_sections):
+        courses.append(record)
+    plain = main.Telegram_Bot.normalize_courses_df(courses.to_frame())
+    compact = main.apply_course_schema(plain.copy())
+    return plain, compact
+
+
+def mutate(df):
+    """Flip the status of every 50th section, as a busy registration sweep would"""
+    changed = df.copy()
+    status = changed['status'].copy()
+    if status.dtype == object:
+        status.iloc[::50] = status.iloc[::50].map({'1': '3', '3': '1'}).fillna('1')
+    else:
+        status.iloc[::50] = 4 - status.iloc[::50]
+    changed['status'] = status
+    return changed
+
+
+def diff_time(df, repeat=3):
+    changed = mutate(df)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        main.diff_course_frames(changed, df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sections', type=int, nargs='+',
+                        default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'sections':>9}{'object MB':>11}{'schema MB':>11}{'ratio':>7}"
+          f"{'object diff ms':>16}{'schema diff ms':>16}")
+    for num_sections in args.sections:
+        plain, compact = build_snapshots(num_sections)
+        plain_mb = plain.memory_usage(deep=True).sum() / 1e6
+        compact_mb = compact.memory_usage(deep=True).sum() / 1e6
+        print(f"{num_sections:>9}{plain_mb:>11.2f}{compact_mb:>11.2f}"
+              f"{plain_mb / compact_mb:>6.1f}x"
+              f"{diff_time(plain) * 1000:>16.1f}{diff_time(compact) * 1000:>16.1f}")
+
+
+if __name__ == '__main__':
+    main_cli()
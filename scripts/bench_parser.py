@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for parsing getCourses payloads.
+
+Compares the old path (rewrite the quoting, json.loads, one DataFrame per
+page, pd.concat) with the streaming parser feeding one CourseColumnBuffer.
+
+    python scripts/bench_parser.py                     # synthetic catalog
+    python scripts/bench_parser.py pages/*.txt         # recorded raw responses
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import main
+from fixtures import make_payload_pages
+
+
+def legacy_parse(payloads):
+    df_list = []
+    for text in payloads:
+        df = pd.DataFrame(json.loads(
+            text.replace('"', '').replace("'", '"').replace('<br><br>', ' - ')))
+        if df.empty:
+            break
+        df_list.append(df)
+    return pd.concat(df_list).reset_index(drop=True)
+
+
+def streaming_parse(payloads):
+    courses = main.CourseColumnBuffer()
+    for text in payloads:
+        if not main.parse_courses_payload(text, courses).rows:
+            break
+    return courses.to_frame()
+
+
+# Payloads the streaming parser must read exactly like the legacy path
+EDGE_CASE_PAYLOADS = [
+    "[{'name':'A','remarks':'Lab} extra','sectionNo':'1'}]",
+    "[{'name':'A','remarks':'{open','sectionNo':'1'},{'name':'B','remarks':'}','sectionNo':'2'}]",
+    "[{'name':'A','sectionNo':'1','nested':{'x':'1'}}]",
+]
+
+
+def check_edge_cases():
+    for payload in EDGE_CASE_PAYLOADS:
+        assert legacy_parse([payload]).equals(streaming_parse([payload])), \
+            f"parsers disagree on {payload}"
+
+
+def best_of(func, payloads, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payloads)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('payloads', nargs='*',
+                        help='recorded getCourses response bodies, in page order')
+    parser.add_argument('--sections', type=int, nargs='+',
+                        default=[200, 2000, 20000],
+                        help='synthetic catalog sizes when no payloads are given')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payloads:
+        datasets = [('recorded', [open(path, encoding='utf-8').read()
+                                  for path in args.payloads])]
+    else:
+        datasets = [(f"{n} sections", make_payload_pages(n))
+                    for n in args.sections]
+
+    check_edge_cases()
+    print(f"{'dataset':<16}{'pages':>7}{'legacy ms':>12}{'streaming ms':>14}{'speedup':>9}")
+    for label, payloads in datasets:
+        legacy = legacy_parse(payloads)
+        streamed = streaming_parse(payloads)
+        assert legacy.equals(streamed), "parsers disagree"
+        legacy_time = best_of(legacy_parse, payloads, args.repeat)
+        streaming_time = best_of(streaming_parse, payloads, args.repeat)
+        print(f"{label:<16}{len(payloads):>7}{legacy_time * 1000:>12.2f}"
+              f"{streaming_time * 1000:>14.2f}{legacy_time / streaming_time:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main_cli()
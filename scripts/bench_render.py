@@ -0,0 +1,113 @@
+"""
+Micro-benchmark for rendering change notifications.
+
+Compares the old row-by-row formatting (iloc, tolist and a status if-chain
+per row) with MessageRenderer formatting whole changeset parts, for every
+message format and language.
+
+    python scripts/bench_render.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from fixtures import make_catalog
+
+LOCATION = 'Course_Data - 3_2_8'
+
+
+def build_changeset(num_rows):
+    """Every section added, and every section's status flipped"""
+    courses = main.CourseColumnBuffer()
+    for record in make_catalog(num_rows):
+        courses.append(record)
+    df = main.apply_course_schema(main.Telegram_Bot.normalize_courses_df(courses.to_frame()))
+    changed = df.copy()
+    changed['status'] = 4 - changed['status']
+    modified = main.diff_course_frames(changed, df)['modified']
+    return {'added': df, 'modified': modified}
+
+
+def legacy_added(frame):
+    messages = []
+    column_names = list(frame.columns)
+    for index in range(frame.shape[0]):
+        row_list = list(map(lambda x: str(x).strip(), frame.iloc[index].tolist()))
+        row_str = []
+        for column_name, value in zip(column_names, row_list):
+            if column_name == 'status':
+                if value == '1':
+                    value = 'Available'
+                elif value == '2':
+                    value = 'Cancelled'
+                elif value == '3':
+                    value = 'Closed'
+            row_str.append(f'{column_name.title()} : {value.title()}')
+        messages.append('Changes Occurs: NEW COURSE(S) ADDED' + '\n\n'
+                        + '\n'.join(row_str) + '\n\n' + LOCATION)
+    return messages
+
+
+def legacy_modified(frame, column):
+    messages = []
+    status_map = {'1': 'Available', '2': 'Cancelled', '3': 'Closed'}
+    for row in frame.itertuples(index=False):
+        old_value = status_map.get(str(row.old), row.old)
+        new_value = status_map.get(str(row.new), row.new)
+        row_str = [f"Course Name: {row.name}", f"Section: {row.sectionNo}",
+                   f"Previous Status: {old_value}", f"New Status: {new_value}"]
+        messages.append(f"Changes Detected in {column.capitalize()}\n\n"
+                        + '\n'.join(row_str) + f"\n\n{LOCATION}")
+    return messages
+
+
+def render(renderer, change_type, frame, column=None):
+    texts = renderer.render(change_type, frame, LOCATION, column)
+    if renderer.digest:
+        return [renderer.digest_message(change_type, texts, LOCATION, column)]
+    return texts
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    changeset = build_changeset(args.rows)
+    added, modified = changeset['added'], changeset['modified']
+    print(f"{len(added)} added rows, {len(modified)} modified values")
+    print(f"{'renderer':>18}{'added ms':>10}{'modified ms':>13}{'rows/s':>11}")
+
+    def report(name, added_seconds, modified_seconds):
+        rows_per_second = (len(added) + len(modified)) / (added_seconds + modified_seconds)
+        print(f"{name:>18}{added_seconds * 1000:>10.1f}{modified_seconds * 1000:>13.1f}"
+              f"{rows_per_second:>11.0f}")
+
+    report('legacy',
+           best_of(lambda: legacy_added(added), args.repeat),
+           best_of(lambda: legacy_modified(modified, 'status'), args.repeat))
+    for message_format in main.message_templates:
+        for language in main.message_labels:
+            renderer = main.MessageRenderer(message_format, language)
+            report(f"{message_format}/{language}",
+                   best_of(lambda: render(renderer, 'added', added), args.repeat),
+                   best_of(lambda: render(renderer, 'modified', modified, 'status'),
+                           args.repeat))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,143 @@
+"""
+End-to-end benchmark of the polling hot path against local stand-ins.
+
+Runs the bot against PortalStub and TelegramStub, in a separate process,
+for catalogs of several sizes. A mutation script changes a few sections every sweep. Reports
+sweep latency, portal requests per second, diff time, peak traced memory
+and notification throughput.
+
+    python scripts/benchmark.py --sections 500 5000 20000 --sweeps 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot
+
+import main
+from fixtures import PAGE_SIZE, make_catalog
+from portal_stub import StubProcess
+
+BENCH_TOKEN = '123456:benchmark'
+BENCH_CHATS = ['1001', '1002']
+
+
+def lift_rate_limits():
+    """Measure the pipeline rather than the configured politeness limits"""
+    for settings in list(main.rate_limit_settings.values()) + [main.chat_rate_limit_settings]:
+        settings.update(rate=10000, burst=10000, max_rate=10000)
+
+
+async def run_catalog(args, sections):
+    catalogs = {f"3_2_{department}": make_catalog(sections, seed=department)
+                for department in range(1, args.departments + 1)}
+    mutations = [
+        {'every': 1, 'action': 'modify', 'field': 'status', 'count': args.changes},
+        {'every': 3, 'action': 'add', 'count': 1},
+        {'every': 4, 'action': 'remove', 'count': 1},
+    ]
+    stubs = StubProcess(catalogs, portal_options={
+        'page_size': args.page_size, 'latency': args.latency,
+        'jitter': args.jitter, 'mutations': mutations}).start()
+    config = {
+        'college_param1': {'bench_college': '2'},
+        'degree_param0': {'bench_degree': '3'},
+        'academic_department_param2': {
+            f"department_{department}": str(department)
+            for department in range(1, args.departments + 1)},
+    }
+
+    diff_timings = []
+    diff_course_frames = main.diff_course_frames
+
+    def timed_diff(*diff_args, **diff_kwargs):
+        start = time.perf_counter()
+        try:
+            return diff_course_frames(*diff_args, **diff_kwargs)
+        finally:
+            diff_timings.append(time.perf_counter() - start)
+
+    # A fresh store per run, so the first sweep always builds the baselines
+    with tempfile.TemporaryDirectory() as data_dir:
+        main.persist_settings['csv_dir'] = data_dir
+        main.persist_settings['database_path'] = os.path.join(data_dir, 'course_history.sqlite3')
+        main.diff_course_frames = timed_diff
+        bot = main.Telegram_Bot(BENCH_TOKEN, BENCH_CHATS, config,
+                                portal_url=stubs.portal_url)
+        bot.bot = Bot(BENCH_TOKEN, base_url=stubs.telegram_base_url)
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                # The first sweep only builds the baselines
+                await bot.get_dataframe_on_parameters()
+                requests_before = stubs.stats()['requests']
+                tracemalloc.start()
+                sweep_timings = []
+                measure_start = time.perf_counter()
+                for _ in range(args.sweeps):
+                    start = time.perf_counter()
+                    await bot.get_dataframe_on_parameters()
+                    sweep_timings.append(time.perf_counter() - start)
+                sweep_total = time.perf_counter() - measure_start
+                await bot.close()
+                notify_total = time.perf_counter() - measure_start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                stats = stubs.stats()
+        finally:
+            main.diff_course_frames = diff_course_frames
+            stubs.stop()
+
+    pages = -(-sections // args.page_size) + 1
+    return {
+        'sections': sections,
+        'pages': pages * args.departments,
+        'sweep_ms': statistics.median(sweep_timings) * 1000,
+        'requests_per_s': (stats['requests'] - requests_before) / sweep_total,
+        'diff_ms': statistics.median(diff_timings) * 1000 if diff_timings else 0.0,
+        'peak_mb': peak / 1e6,
+        'notifications': stats['messages'],
+        'notifications_per_s': stats['messages'] / notify_total,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sections', type=int, nargs='+', default=[500, 5000, 20000],
+                        help='sections per department')
+    parser.add_argument('--departments', type=int, default=4)
+    parser.add_argument('--sweeps', type=int, default=5)
+    parser.add_argument('--changes', type=int, default=10,
+                        help='status flips per department per sweep')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='portal response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--real-limits', action='store_true',
+                        help='keep the configured rate limits instead of lifting them')
+    args = parser.parse_args()
+
+    if not args.real_limits:
+        lift_rate_limits()
+
+    print(f"{'sections':>9}{'pages':>7}{'sweep ms':>10}{'req/s':>9}{'diff ms':>9}"
+          f"{'peak MB':>9}{'msgs':>6}{'msgs/s':>8}")
+    for sections in args.sections:
+        result = asyncio.run(run_catalog(args, sections))
+        print(f"{result['sections']:>9}{result['pages']:>7}{result['sweep_ms']:>10.1f}"
+              f"{result['requests_per_s']:>9.1f}{result['diff_ms']:>9.2f}"
+              f"{result['peak_mb']:>9.1f}{result['notifications']:>6}"
+              f"{result['notifications_per_s']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main_cli()
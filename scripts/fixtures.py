@@ -0,0 +1,137 @@
+"""
+Recorded and synthetic getCourses pages in the portal's payload format.
+
+The portal answers getCourses with a JSON-like array quoted with single
+quotes, where remarks use '<br><br>' as a line separator. These helpers
+build catalogs of that shape for the benchmarks when no recorded pages
+are available, and record real pages for replay by portal_stub.py:
+
+    python scripts/fixtures.py record fixtures/ --combination 3_2_8
+
+Recorded pages are stored as <dir>/<param0>_<param1>_<param2>/page_NNN.txt.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import sys
+
+COURSE_FIELDS = ['name', 'sectionNo', 'status', 'times', 'days', 'rooms',
+                 'lecturers', 'hours', 'remarks']
+PAGE_SIZE = 20
+
+_SUBJECTS = ['Calculus', 'Physics', 'Programming', 'Circuits', 'Statics',
+             'Arabic Language', 'English Skills', 'Thermodynamics',
+             'Data Structures', 'Linear Algebra', 'رياضيات', 'فيزياء']
+_DAYS = ['Sun Tue Thu', 'Mon Wed', 'Sun Tue', 'Sat', 'Mon']
+_TIMES = ['08:00-09:00', '09:00-10:00', '10:00-11:30', '11:30-13:00',
+          '13:00-14:30', '14:30-16:00']
+_LECTURERS = [f"Dr. Lecturer {n}" for n in range(40)]
+_ROOMS = [f"E{floor}{room:02d}" for floor in range(1, 4) for room in range(1, 16)]
+
+
+def make_catalog(num_sections, seed=0):
+    """Return num_sections course records with realistic low-cardinality fields"""
+    rng = random.Random(seed)
+    records = []
+    course = 0
+    while len(records) < num_sections:
+        name = f"{rng.choice(_SUBJECTS)} {course}"
+        for section in range(1, rng.randint(1, 4) + 1):
+            records.append({
+                'name': name,
+                'sectionNo': str(section),
+                'status': rng.choice('1113'),
+                'times': rng.choice(_TIMES),
+                'days': rng.choice(_DAYS),
+                'rooms': rng.choice(_ROOMS),
+                'lecturers': rng.choice(_LECTURERS),
+                'hours': rng.choice('33334'),
+                'remarks': rng.choice(['', '', 'Lab<br><br>Bring ID', 'Online', 'Lab} see {notes}']),
+            })
+            if len(records) == num_sections:
+                break
+        course += 1
+    return records
+
+
+def render_payload(records):
+    """Render records the way the portal sends them"""
+    rows = (",".join(f"'{key}':'{value}'" for key, value in record.items())
+            for record in records)
+    return "[" + ",".join("{" + row + "}" for row in rows) + "]"
+
+
+def paginate(records, page_size=PAGE_SIZE):
+    """Split records into portal pages; the list ends with the empty page that stops a sweep"""
+    pages = [records[start:start + page_size]
+             for start in range(0, len(records), page_size)]
+    pages.append([])
+    return pages
+
+
+def make_payload_pages(num_sections, page_size=PAGE_SIZE, seed=0):
+    """Return the rendered payload of every page of a synthetic catalog"""
+    return [render_payload(page)
+            for page in paginate(make_catalog(num_sections, seed), page_size)]
+
+
+def load_recorded_catalogs(fixture_dir):
+    """Load recorded pages into {combination key: records}"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import main
+
+    catalogs = {}
+    for combination_dir in sorted(glob.glob(os.path.join(fixture_dir, '*'))):
+        if not os.path.isdir(combination_dir):
+            continue
+        records = []
+        for page_path in sorted(glob.glob(os.path.join(combination_dir, 'page_*.txt'))):
+            with open(page_path, encoding='utf-8') as f:
+                records.extend(main.iter_course_records(f.read()))
+        catalogs[os.path.basename(combination_dir)] = records
+    return catalogs
+
+
+async def record_combination(combination, fixture_dir, portal_url=None):
+    """Save every raw page of one combination ("param0_param1_param2") from the portal"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import httpx
+    import main
+
+    degree_id, college_id, department_id = combination.split('_')
+    out_dir = os.path.join(fixture_dir, combination)
+    os.makedirs(out_dir, exist_ok=True)
+    async with httpx.AsyncClient(timeout=30) as client:
+        for page_num in range(1, main.fetch_settings['max_pages'] + 1):
+            payload = f"method=getCourses&paramsCount=4&param0={degree_id}&param1={college_id}&param2={department_id}&param3={page_num}"
+            response = await client.post(portal_url or main.portal_url,
+                                         headers=main.portal_headers,
+                                         content=payload)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            with open(os.path.join(out_dir, f"page_{page_num:03d}.txt"), 'w',
+                      encoding='utf-8') as f:
+                f.write(response.text)
+            if not any(True for _ in main.iter_course_records(response.text)):
+                return page_num
+    return page_num
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Record getCourses pages for replay')
+    parser.add_argument('command', choices=['record'])
+    parser.add_argument('fixture_dir')
+    parser.add_argument('--combination', action='append', required=True,
+                        help='param0_param1_param2, e.g. 3_2_8')
+    parser.add_argument('--portal-url')
+    args = parser.parse_args()
+    for combination in args.combination:
+        pages = asyncio.run(record_combination(combination, args.fixture_dir,
+                                               args.portal_url))
+        print(f"Recorded {pages} page(s) for {combination}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,381 @@
+"""
+Local stand-ins for the course portal and the Telegram Bot API.
+
+PortalStub replays getCourses pages, either recorded ones (see
+fixtures.py record) or a synthetic catalog, with configurable latency,
+error rate and a mutation script that adds, removes and modifies sections
+as sweeps go by. Sessions are handed out by GET index.jsp; with
+session_required, getCourses calls without a current session cookie get
+the HTML login page, and expire_sessions_after ends sessions after that
+many requests. TelegramStub accepts sendMessage calls and counts them,
+optionally answering with 429 flood-control errors.
+
+    python scripts/portal_stub.py --sections 500 --latency 0.05 \
+        --mutations mutations.json
+
+then point main.portal_url at the printed portal URL. A mutation script is
+a JSON list of steps applied when a combination's page 1 is requested for
+the given sweep (or every N sweeps):
+
+    [{"sweep": 3, "action": "modify", "field": "status", "value": "3", "count": 5},
+     {"every": 2, "action": "add", "count": 1},
+     {"sweep": 5, "action": "remove", "count": 2, "combination": "3_2_8"}]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import PAGE_SIZE, load_recorded_catalogs, make_catalog, render_payload
+
+
+class _StubServer:
+    """Runs a ThreadingHTTPServer on a background thread"""
+
+    def __init__(self, handler, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _PortalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type='text/plain', cookie=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if cookie:
+            self.send_header('Set-Cookie', f'JSESSIONID={cookie}; Path=/courses')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply(200, '<html><body>Courses</body></html>', 'text/html',
+                    cookie=self.server.stub.new_session())
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length', 0))
+        params = {key: values[0] for key, values in
+                  parse_qs(self.rfile.read(length).decode()).items()}
+        cookies = dict(part.strip().split('=', 1) for part in
+                       self.headers.get('Cookie', '').split(';') if '=' in part)
+        if not stub.check_session(cookies.get('JSESSIONID')):
+            self._reply(200, '<html><body>Login</body></html>', 'text/html')
+            return
+        status, body = stub.handle(params)
+        self._reply(status, body)
+
+
+class PortalStub(_StubServer):
+    """
+    Stand-in for the getCourses endpoint.
+
+    catalogs maps a combination key "<degree>_<college>_<department>"
+    (param0_param1_param2) to its list of course records.
+    """
+
+    path = '/courses/actions/rmiMethod'
+
+    def __init__(self, catalogs, page_size=PAGE_SIZE, latency=0.0, jitter=0.0,
+                 error_rate=0.0, mutations=(), seed=0, session_required=False,
+                 expire_sessions_after=0, host='127.0.0.1', port=0):
+        super().__init__(_PortalHandler, host, port)
+        self.catalogs = {key: list(records) for key, records in catalogs.items()}
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.mutations = list(mutations)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sweeps = {}
+        self.requests = 0
+        self.errors = 0
+        self.session_required = session_required
+        self.expire_sessions_after = expire_sessions_after
+        self.session = None
+        self.session_requests = 0
+        self.sessions = 0
+
+    def new_session(self):
+        with self.lock:
+            self.sessions += 1
+            self.session = f"stub{self.sessions}"
+            self.session_requests = 0
+            return self.session
+
+    def check_session(self, cookie):
+        """Count a getCourses call against the session and say whether it is accepted"""
+        if not self.session_required:
+            return True
+        with self.lock:
+            if cookie is None or cookie != self.session:
+                return False
+            self.session_requests += 1
+            if self.expire_sessions_after and self.session_requests > self.expire_sessions_after:
+                self.session = None
+                return False
+            return True
+
+    @property
+    def portal_url(self):
+        return self.url + self.path
+
+    def handle(self, params):
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        key = f"{params.get('param0')}_{params.get('param1')}_{params.get('param2')}"
+        page = int(params.get('param3', 1))
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.errors += 1
+                return 500, 'Internal Server Error'
+            records = self.catalogs.get(key, [])
+            if page == 1:
+                self.sweeps[key] = self.sweeps.get(key, 0) + 1
+                self._apply_mutations(key, records)
+            start = (page - 1) * self.page_size
+            return 200, render_payload(records[start:start + self.page_size])
+
+    def _apply_mutations(self, key, records):
+        sweep = self.sweeps[key]
+        for step in self.mutations:
+            if step.get('combination', key) != key:
+                continue
+            if 'sweep' in step and step['sweep'] != sweep:
+                continue
+            if 'every' in step and sweep % step['every']:
+                continue
+            self.mutate(records, step)
+
+    def mutate(self, records, step):
+        """Apply one mutation step to a catalog in place"""
+        count = step.get('count', 1)
+        action = step['action']
+        if action == 'add':
+            for number in range(count):
+                template = dict(self.rng.choice(records)) if records else {
+                    'name': 'New Course', 'status': '1'}
+                template['sectionNo'] = str(100 + len(records) + number)
+                records.insert(self.rng.randrange(len(records) + 1), template)
+        elif action == 'remove':
+            for _ in range(min(count, len(records))):
+                records.pop(self.rng.randrange(len(records)))
+        elif action == 'modify':
+            field = step.get('field', 'status')
+            for index in self.rng.sample(range(len(records)),
+                                         min(count, len(records))):
+                record = dict(records[index])
+                if 'value' in step:
+                    record[field] = step['value']
+                elif field == 'status':
+                    record[field] = '3' if record.get(field) == '1' else '1'
+                else:
+                    record[field] = f"{record.get(field, '')}*"
+                records[index] = record
+        else:
+            raise ValueError(f"Unknown mutation action: {action}")
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        method = self.path.rsplit('/', 1)[-1]
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            params = json.loads(body or b'{}')
+        else:
+            params = {key: values[0] for key, values in
+                      parse_qs(body.decode()).items()}
+        status, payload = stub.handle(method, params)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TelegramStub(_StubServer):
+    """
+    Stand-in for the Telegram Bot API. Use base_url as the Bot's base_url.
+    Every flood_every-th sendMessage is answered with a 429 and retry_after.
+    """
+
+    def __init__(self, flood_every=0, retry_after=1, host='127.0.0.1', port=0):
+        super().__init__(_TelegramHandler, host, port)
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.messages = []
+        self.calls = 0
+
+    @property
+    def base_url(self):
+        return self.url + '/bot'
+
+    def handle(self, method, params):
+        with self.lock:
+            self.calls += 1
+            if method == 'getMe':
+                return 200, {'ok': True, 'result': {
+                    'id': 1, 'is_bot': True, 'first_name': 'stub',
+                    'username': 'stub_bot'}}
+            if method != 'sendMessage':
+                return 200, {'ok': True, 'result': True}
+            if self.flood_every and self.calls % self.flood_every == 0:
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': 'Too Many Requests',
+                             'parameters': {'retry_after': self.retry_after}}
+            self.messages.append((params.get('chat_id'), params.get('text', '')))
+            chat_id = params.get('chat_id')
+            return 200, {'ok': True, 'result': {
+                'message_id': len(self.messages),
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id) if str(chat_id).lstrip('-').isdigit() else 0,
+                         'type': 'private'},
+                'text': params.get('text', '')}}
+
+
+def _serve(connection, catalogs, portal_options, telegram_options):
+    portal = PortalStub(catalogs, **portal_options).start()
+    telegram = TelegramStub(**telegram_options).start()
+    connection.send((portal.portal_url, telegram.base_url))
+    try:
+        while connection.recv() == 'stats':
+            connection.send({'requests': portal.requests, 'errors': portal.errors,
+                             'sessions': portal.sessions,
+                             'messages': len(telegram.messages)})
+    finally:
+        portal.stop()
+        telegram.stop()
+
+
+class StubProcess:
+    """
+    Runs PortalStub and TelegramStub in a child process, so the stand-ins do
+    not compete with the bot under test for the GIL.
+    """
+
+    def __init__(self, catalogs, portal_options=None, telegram_options=None):
+        self.catalogs = catalogs
+        self.portal_options = portal_options or {}
+        self.telegram_options = telegram_options or {}
+        self.process = None
+        self.connection = None
+        self.portal_url = None
+        self.telegram_base_url = None
+
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_serve, daemon=True,
+            args=(child_connection, self.catalogs, self.portal_options,
+                  self.telegram_options))
+        self.process.start()
+        self.portal_url, self.telegram_base_url = self.connection.recv()
+        return self
+
+    def stats(self):
+        """Return the request, error and message counters of the stand-ins"""
+        self.connection.send('stats')
+        return self.connection.recv()
+
+    def stop(self):
+        self.connection.send('stop')
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8778)
+    parser.add_argument('--telegram-port', type=int, default=8779)
+    parser.add_argument('--fixtures', help='directory of recorded pages')
+    parser.add_argument('--combination', action='append', default=[],
+                        help='param0_param1_param2 served with a synthetic catalog')
+    parser.add_argument('--sections', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--session-required', action='store_true')
+    parser.add_argument('--expire-sessions-after', type=int, default=0)
+    parser.add_argument('--mutations', help='JSON mutation script')
+    parser.add_argument('--flood-every', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        catalogs = load_recorded_catalogs(args.fixtures)
+    else:
+        combinations = args.combination or ['3_2_8']
+        catalogs = {key: make_catalog(args.sections, seed=seed)
+                    for seed, key in enumerate(combinations)}
+    mutations = []
+    if args.mutations:
+        with open(args.mutations, encoding='utf-8') as f:
+            mutations = json.load(f)
+
+    portal = PortalStub(catalogs, page_size=args.page_size, latency=args.latency,
+                        jitter=args.jitter, error_rate=args.error_rate,
+                        mutations=mutations, session_required=args.session_required,
+                        expire_sessions_after=args.expire_sessions_after,
+                        port=args.port).start()
+    telegram = TelegramStub(flood_every=args.flood_every,
+                            port=args.telegram_port).start()
+    print(f"Portal stand-in:   {portal.portal_url} ({', '.join(catalogs)})")
+    print(f"Telegram stand-in: {telegram.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        portal.stop()
+        telegram.stop()
+        print(f"Served {portal.requests} portal request(s), "
+              f"{len(telegram.messages)} message(s)")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,78 @@
+"""
+Manage per-chat subscriptions in the course store.
+
+A chat with subscriptions only receives the changes matching at least one
+of them; every filter left out matches anything:
+
+    python scripts/subscriptions.py add 123456 --course "Calculus 1" --section 2
+    python scripts/subscriptions.py add 123456 --lecturer "Dr. Lecturer 4" --columns times rooms
+    python scripts/subscriptions.py add 123456 --department humanities_basic_sciences \
+        --transition seat_opened
+    python scripts/subscriptions.py list [--chat 123456]
+    python scripts/subscriptions.py remove --id 3 | --chat 123456
+
+--columns takes column names and/or added/removed. --transition takes
+old>new status names (available, cancelled, closed, '*' for any) or one of
+seat_opened, seat_closed, cancelled. A running bot picks changes up within
+subscription_settings['reload_seconds'].
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database', default=main.persist_settings['database_path'])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='subscribe a chat')
+    add.add_argument('chat_id')
+    add.add_argument('--department', help='department name or id from config_dict')
+    add.add_argument('--course', help='course name')
+    add.add_argument('--section', help='section number')
+    add.add_argument('--lecturer')
+    add.add_argument('--columns', nargs='+',
+                     choices=main.priority_columns + ['added', 'removed'])
+    add.add_argument('--transition')
+
+    listing = commands.add_parser('list', help='show subscriptions')
+    listing.add_argument('--chat')
+
+    remove = commands.add_parser('remove', help='delete subscriptions')
+    target = remove.add_mutually_exclusive_group(required=True)
+    target.add_argument('--id', type=int)
+    target.add_argument('--chat')
+
+    args = parser.parse_args()
+    store = main.CourseStore(args.database)
+    try:
+        if args.command == 'add':
+            try:
+                subscription_id = store.add_subscription(
+                    args.chat_id, department=args.department, course=args.course,
+                    section=args.section, lecturer=args.lecturer,
+                    columns=args.columns, transition=args.transition)
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"Added subscription {subscription_id} for chat {args.chat_id}")
+        elif args.command == 'list':
+            fields = ['department', 'course', 'section', 'lecturer', 'columns', 'transition']
+            for subscription in store.load_subscriptions(args.chat):
+                filters = ', '.join(f"{field}={subscription[field]}" for field in fields
+                                    if subscription[field])
+                print(f"{subscription['id']:>5}  chat {subscription['chat_id']}: "
+                      f"{filters or 'everything'}")
+        else:
+            removed = store.remove_subscriptions(args.id, args.chat)
+            print(f"Removed {removed} subscription(s)")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main_cli()